@@ -0,0 +1,164 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import zstandard
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    shard TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    name TEXT PRIMARY KEY,
+    game_id INTEGER,
+    page INTEGER,
+    hash TEXT NOT NULL REFERENCES blobs (hash),
+    stored_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_game ON pages (game_id, page);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+LEGACY_PAGE_NAME = re.compile(r'saved(\d+)_(\d+)')
+
+
+class HtmlArchive:
+    """
+    Content-addressed store for scraped pages.
+
+    Each distinct page body is compressed as its own zstd frame and appended to the current
+    shard file, so any page can be read back with a single seek. An SQLite index maps page
+    names (and game ID / page number) to the SHA-256 of their content, and content hashes to
+    shard offsets, so identical pages are only stored once. Every writer appends to its own
+    shard files, so several scraper processes can share one archive. As with GameCatalog, the
+    index uses WAL mode unless `shared_filesystem` is set, which is required for processes on
+    several hosts.
+
+    Pages scraped as loose .html files into `legacy_dir` are imported the first time the
+    archive is opened, as GameCatalog does with links.json.
+    """
+
+    def __init__(self, root, shard_size: int = 256 * 1024 * 1024, compression_level: int = 10,
+                 writer: str = 'main', shared_filesystem: bool = False, legacy_dir=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.writer = writer
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._lock = threading.Lock()
+        self._readers = {}
+
+        self.conn = sqlite3.connect(self.root / 'index.sqlite3', timeout=30, check_same_thread=False)
+        if shared_filesystem:
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        existing_shards = sorted(self.root.glob(f"shard-{writer}-?????.zst"))
+        self._shard = int(existing_shards[-1].stem.rsplit('-', 1)[1]) if existing_shards else 0
+        if legacy_dir:
+            self._import_legacy_pages(Path(legacy_dir))
+
+    @classmethod
+    def from_config(cls, config: dict, writer: str = 'main') -> "HtmlArchive":
+        return cls(config['archive_dir'], config.get('archive_shard_size') or 256 * 1024 * 1024, writer=writer,
+                   shared_filesystem=bool(config.get('shared_filesystem')),
+                   legacy_dir=config.get('scrape_output_dir'))
+
+    def _import_legacy_pages(self, directory: Path, batch_size: int = 1000):
+        # Pages already archived are skipped, so an import interrupted (or run by several workers) just resumes
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone() or not directory.is_dir():
+            return
+        with self._lock:
+            for count, path in enumerate(sorted(directory.glob('saved*_*.html')), 1):
+                match = LEGACY_PAGE_NAME.fullmatch(path.stem)
+                if match and self.conn.execute("SELECT 1 FROM pages WHERE name = ?", (path.stem,)).fetchone() is None:
+                    self._store(path.stem, path.read_text(encoding='utf-8'), int(match[1]), int(match[2]))
+                if count % batch_size == 0:
+                    self.conn.commit()
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                              (datetime.utcnow().isoformat(),))
+            self.conn.commit()
+
+    def _shard_name(self, shard: int) -> str:
+        return f"shard-{self.writer}-{shard:05d}.zst"
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+            self.conn.close()
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM pages WHERE name = ?", (name,)).fetchone() is not None
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT name FROM pages ORDER BY game_id, page, name")]
+
+    def content_hash(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT hash FROM pages WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, name: str, html: str, game_id: int, page: int) -> bool:
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        is_new = self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone() is None
+        if is_new:
+            frame = self._compressor.compress(data)
+            path = self.root / self._shard_name(self._shard)
+            if path.exists() and path.stat().st_size + len(frame) > self.shard_size:
+                self._shard += 1
+                path = self.root / self._shard_name(self._shard)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(frame)
+            # Another writer may have stored the same content meanwhile; either copy is valid
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, shard, offset, length, size) VALUES (?, ?, ?, ?, ?)",
+                (digest, path.name, offset, len(frame), len(data))
+            )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (name, game_id, page, hash, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (name, game_id, page, digest, datetime.utcnow().isoformat())
+        )
+        return is_new
+
+    def put(self, name: str, html: str, game_id: int = None, page: int = None) -> bool:
+        """Store a page, returning False if identical content was already archived."""
+        with self._lock:
+            is_new = self._store(name, html, game_id, page)
+            self.conn.commit()
+        return is_new
+
+    def get(self, name: str) -> str:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT b.shard, b.offset, b.length FROM pages p JOIN blobs b ON b.hash = p.hash WHERE p.name = ?",
+                (name,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(name)
+            shard, offset, length = row
+            reader = self._readers.get(shard)
+            if reader is None:
+                reader = self._readers[shard] = open(self.root / shard, 'rb')
+            reader.seek(offset)
+            frame = reader.read(length)
+        # Decompressor objects are not thread-safe, so each read gets its own
+        return zstandard.ZstdDecompressor().decompress(frame).decode('utf-8')
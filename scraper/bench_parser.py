@@ -0,0 +1,83 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+from extractors import create_extractor
+from parse_manifest import ParseManifest
+from parser import DataCollector
+
+BACKENDS = ('soup', 'lxml')
+
+
+def run_backend(collector: DataCollector, backend: str, documents: dict) -> tuple[dict, float]:
+    """Parse every document with one backend, returning the JSON each produces and the time taken."""
+    collector.extractor = create_extractor(backend, collector._utils)
+    outputs = {}
+    start = time.monotonic()
+    for file, html_doc in documents.items():
+        try:
+            outputs[file] = json.dumps(collector.parse_html(html_doc))
+        except Exception as e:
+            outputs[file] = f"error: {type(e).__name__}"
+    return outputs, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parser backends in files/sec and check they agree")
+    parser.add_argument('--config', default='./config.yaml')
+    parser.add_argument('--sample', type=int, default=200, help="Number of scraped pages to parse (0 for all)")
+    parser.add_argument('--check', action='store_true',
+                        help="Fail unless every backend produces identical JSON, and record the pages where it does, "
+                             "so the parser need not check them itself; pages already recorded are skipped")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = yaml.safe_load(Path(args.config).read_text())
+    collector = DataCollector(config)
+    files = sorted(collector._get_input_files())
+    manifest = ParseManifest.from_config(config) if args.check else None
+    collector.manifest = manifest
+    if manifest:
+        hashes = {file: collector._input_state(file)[0] for file in files}
+        unchecked = set().union(*(manifest.unchecked(hashes.values(), collector.backend_version(backend))
+                                  for backend in BACKENDS[1:]))
+        print(f"Skipping {sum(hashes[file] not in unchecked for file in files)} files already checked")
+        files = [file for file in files if hashes[file] in unchecked]
+        if not files:
+            manifest.close()
+            return
+    if args.sample and args.sample < len(files):
+        files = sorted(random.Random(args.seed).sample(files, args.sample))
+    # Read everything up front so only extraction is timed
+    documents = {file: collector._read_input_file(file) for file in files}
+
+    outputs = {}
+    for backend in BACKENDS:
+        outputs[backend], elapsed = run_backend(collector, backend, documents)
+        print(f"{backend}: {len(documents)} files in {elapsed:.2f}s ({len(documents) / elapsed:.1f} files/sec)")
+
+    reference = outputs[BACKENDS[0]]
+    mismatches = 0
+    for backend in BACKENDS[1:]:
+        differing = [file for file in files if outputs[backend][file] != reference[file]]
+        mismatches += len(differing)
+        print(f"{backend}: {len(files) - len(differing)}/{len(files)} files identical to {BACKENDS[0]}")
+        for file in differing[:5]:
+            print(f"  {file} differs")
+        if manifest:
+            identical = [file for file in files if outputs[backend][file] == reference[file]]
+            manifest.record_check({hashes[file] for file in identical}, collector.backend_version(backend))
+    if manifest:
+        manifest.commit()
+        manifest.close()
+    if args.check and mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from scraper import Scraper
+
+VARIANTS = {
+    'baseline': {'reuse_pages': False, 'block_resources': False},
+    'pooled': {'reuse_pages': True, 'block_resources': False},
+    'pooled+blocking': {'reuse_pages': True, 'block_resources': True},
+}
+
+
+def _copy_catalog(src: str, dst: Path):
+    """Snapshot the catalog so benchmark runs never touch the real scrape status."""
+    source, target = sqlite3.connect(src), sqlite3.connect(dst)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+async def run_variant(config: dict, overrides: dict, work_dir: Path) -> tuple[int, float]:
+    variant_config = {
+        **config,
+        **overrides,
+        'http_fast_path': False,  # The variants differ only in how the browser is driven
+        'scrape_output_dir': str(work_dir / 'saved_files'),
+        'archive_dir': str(work_dir / 'saved_files' / 'archive'),
+        'catalog_path': str(work_dir / 'catalog.sqlite3'),
+        'metrics_dir': str(work_dir / 'metrics'),
+        'resume_enabled': False,
+    }
+    _copy_catalog(config['catalog_path'], work_dir / 'catalog.sqlite3')
+    config_path = work_dir / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(variant_config))
+
+    scraper = Scraper(str(config_path))
+    start = time.monotonic()
+    await scraper.run()
+    elapsed = time.monotonic() - start
+    return scraper.counts['successful'] + scraper.counts['failed'], elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare scraper throughput in pages/minute")
+    parser.add_argument('--config', default='./config.yaml')
+    parser.add_argument('--games', type=int, default=20, help="Number of games to scrape per variant")
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    args = parser.parse_args()
+
+    config = yaml.safe_load(Path(args.config).read_text())
+    config['start_index'] = config['start_index'] or 0
+    config['end_index'] = config['start_index'] + args.games
+
+    results = {}
+    for name in args.variants:
+        work_dir = Path(tempfile.mkdtemp(prefix=f"bench_{name.replace('+', '_')}_"))
+        try:
+            pages, elapsed = await run_variant(config, VARIANTS[name], work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        results[name] = pages / elapsed * 60 if elapsed else 0
+        print(f"{name}: {pages} pages in {elapsed:.1f}s ({results[name]:.1f} pages/min)")
+
+    if 'baseline' in results and results['baseline']:
+        for name, rate in results.items():
+            if name != 'baseline':
+                print(f"{name}: {rate / results['baseline']:.2f}x baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
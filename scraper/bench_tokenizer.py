@@ -0,0 +1,72 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+from catalog import GameCatalog
+from game_reader import GameReader
+from metrics import Metrics
+from tokenizer import create_tokenizer, normalize_comment
+
+TOKENIZERS = ('nltk', 'fast')
+
+
+def load_comments(config: dict, split: str) -> list[str]:
+    """Every comment of a split, normalized as preprocess.py tokenizes it."""
+    split_data = json.loads(Path(config['split_data_path']).read_text())
+    game_ids = split_data[split]
+    catalog = GameCatalog.from_config(config)
+    reader = GameReader(config, catalog, Metrics('bench_tokenizer'), validated=bool(config.get('validate_moves')))
+    comments = [normalize_comment(step['comment'])
+                for _, pages in reader.iter_games(game_ids) for _, steps in pages for step in steps]
+    catalog.close()
+    return comments
+
+
+def run_tokenizer(name: str, comments: list[str]) -> tuple[list[list[str]], float]:
+    """Tokenize every comment with one tokenizer, returning the tokens and the time taken."""
+    tokenize = create_tokenizer(name)
+    start = time.monotonic()
+    tokens = [tokenize(comment) for comment in comments]
+    return tokens, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare comment tokenizers in tokens/sec and check they agree")
+    parser.add_argument('--config', default='./config.yaml')
+    parser.add_argument('--split', default='valid', help="Split whose comments are tokenized")
+    parser.add_argument('--sample', type=int, default=0, help="Number of comments to tokenize (0 for all)")
+    parser.add_argument('--check', action='store_true', help="Fail unless every tokenizer produces identical tokens")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = yaml.safe_load(Path(args.config).read_text())
+    comments = load_comments(config, args.split)
+    if args.sample and args.sample < len(comments):
+        comments = random.Random(args.seed).sample(comments, args.sample)
+
+    outputs = {}
+    for name in TOKENIZERS:
+        outputs[name], elapsed = run_tokenizer(name, comments)
+        token_count = sum(map(len, outputs[name]))
+        print(f"{name}: {len(comments)} comments, {token_count} tokens in {elapsed:.2f}s "
+              f"({token_count / elapsed:.0f} tokens/sec)")
+
+    reference = outputs[TOKENIZERS[0]]
+    mismatches = 0
+    for name in TOKENIZERS[1:]:
+        differing = [i for i, tokens in enumerate(outputs[name]) if tokens != reference[i]]
+        mismatches += len(differing)
+        print(f"{name}: {len(comments) - len(differing)}/{len(comments)} comments identical to {TOKENIZERS[0]}")
+        for i in differing[:5]:
+            print(f"  {comments[i]!r}\n    {TOKENIZERS[0]}: {reference[i]}\n    {name}: {outputs[name][i]}")
+    if args.check and mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
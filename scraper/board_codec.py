@@ -0,0 +1,84 @@
+from typing import Optional
+
+# FEN letter (black's) for each piece sprite row offset; the sprite column is 0 for white
+SPRITE_LETTERS = {'0': 'k', '-30': 'q', '-60': 'r', '-90': 'n', '-120': 'b', '-150': 'p'}
+
+PIECE_NAMES = {'k': 'king', 'q': 'queen', 'r': 'rook', 'n': 'knight', 'b': 'bishop', 'p': 'pawn'}
+LETTER_PIECES = {
+    **{letter.upper(): f"white_{name}" for letter, name in PIECE_NAMES.items()},
+    **{letter: f"black_{name}" for letter, name in PIECE_NAMES.items()},
+}
+PIECE_LETTERS = {name: letter for letter, name in LETTER_PIECES.items()}
+
+
+def cells_to_fen(board_element_vals: list) -> Optional[str]:
+    """
+    FEN piece placement for the board cells scraped from a cdiag_frame.
+
+    Cells come file by file (a1, a2, ..., h8). Returns None for boards FEN cannot express
+    (not 64 cells, or a sprite offset that is not a known piece), which are kept as cell lists.
+    """
+    if len(board_element_vals) != 64:
+        return None
+
+    letters = []
+    for cell in board_element_vals:
+        letter = ''
+        if 'left_img' in cell and 'top_img' in cell:
+            letter = SPRITE_LETTERS.get(cell['top_img'])
+            if letter is None:
+                return None
+            if int(cell['left_img']) == 0:
+                letter = letter.upper()
+        letters.append(letter)
+    return _letters_to_fen(letters)
+
+
+def _letters_to_fen(letters: list[str]) -> str:
+    """FEN placement for 64 cell letters ('' for empty) in the parser's cell order."""
+    ranks = [[''] * 8 for _ in range(8)]
+    for index, letter in enumerate(letters):
+        ranks[7 - index % 8][index // 8] = letter
+
+    rows = []
+    for rank in ranks:
+        row, empty = "", 0
+        for letter in rank:
+            if letter:
+                row += (str(empty) if empty else "") + letter
+                empty = 0
+            else:
+                empty += 1
+        rows.append(row + (str(empty) if empty else ""))
+    return "/".join(rows)
+
+
+def fen_to_pieces(fen: str) -> list[str]:
+    """Piece name or 'eps' for each of the 64 cells, in the parser's cell order (a1, a2, ..., h8)."""
+    ranks = []
+    for row in fen.split("/"):
+        rank = []
+        for char in row:
+            if char.isdigit():
+                rank.extend(['eps'] * int(char))
+            else:
+                rank.append(LETTER_PIECES[char])
+        ranks.append(rank)
+    return [ranks[7 - rank][file] for file in range(8) for rank in range(8)]
+
+
+def board_fen(board) -> Optional[str]:
+    """FEN placement of a parsed board in either format, or None if it cannot be expressed."""
+    if isinstance(board, str):
+        return board
+    letters = [PIECE_LETTERS.get(piece, '?') if piece != 'eps' else '' for piece in board_pieces(board)]
+    if len(letters) != 64 or '?' in letters:
+        return None
+    return _letters_to_fen(letters)
+
+
+def board_pieces(board) -> list[str]:
+    """Piece names for a parsed board in either format: a FEN placement or a list of cells."""
+    if isinstance(board, str):
+        return fen_to_pieces(board)
+    return [x['piece'] if 'piece' in x else 'eps' for x in board]
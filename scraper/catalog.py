@@ -0,0 +1,137 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    page_count INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new',
+    discovered_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_status ON games (status);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class GameCatalog:
+    """
+    SQLite store of every discovered game, shared by all scraping stages.
+
+    Game IDs are assigned in discovery order starting from 0 and never change, so they
+    can be used in file names and splits. An existing links.json is imported on first use,
+    keeping each game's position in that file as its ID.
+
+    The database uses WAL mode, which needs shared memory, so all its users must be on one host.
+    With `shared_filesystem`, it uses the rollback journal instead, which relies only on file
+    locks, so scraper workers on several hosts can share it over a network filesystem.
+    """
+
+    STATUS_NEW = 'new'
+    STATUS_SCRAPED = 'scraped'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, path, legacy_links_path=None, shared_filesystem: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        if shared_filesystem:
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if legacy_links_path:
+            self._import_legacy_links(Path(legacy_links_path))
+
+    @classmethod
+    def from_config(cls, config: dict) -> "GameCatalog":
+        return cls(config['catalog_path'], config.get('saved_links_path'), bool(config.get('shared_filesystem')))
+
+    def _import_legacy_links(self, path: Path):
+        if len(self) or not path.exists():
+            return
+        with open(path, 'r') as f:
+            links = json.load(f)
+        now = datetime.utcnow().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO games (id, link, page_count, discovered_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(index, link, page_count, now, now) for index, (link, page_count) in enumerate(links.items())]
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def __contains__(self, link: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM games WHERE link = ?", (link,)).fetchone() is not None
+
+    def add_game(self, link: str, page_count: int) -> int:
+        """Insert a game, or update its page count if it is already known. Returns its ID."""
+        now = datetime.utcnow().isoformat()
+        self.conn.execute(
+            "INSERT INTO games (id, link, page_count, discovered_at, updated_at) "
+            "SELECT COALESCE(MAX(id) + 1, 0), ?, ?, ?, ? FROM games WHERE true "
+            "ON CONFLICT (link) DO UPDATE SET page_count = excluded.page_count, updated_at = excluded.updated_at",
+            (link, page_count, now, now)
+        )
+        return self.conn.execute("SELECT id FROM games WHERE link = ?", (link,)).fetchone()[0]
+
+    def get_game(self, game_id: int) -> Optional[tuple[str, int]]:
+        """Return (link, page_count) for a game ID."""
+        return self.conn.execute("SELECT link, page_count FROM games WHERE id = ?", (game_id,)).fetchone()
+
+    def get_id(self, link: str) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM games WHERE link = ?", (link,)).fetchone()
+        return row[0] if row else None
+
+    def get_page_count(self, game_id: int) -> int:
+        row = self.conn.execute("SELECT page_count FROM games WHERE id = ?", (game_id,)).fetchone()
+        return row[0] if row else 0
+
+    def game_ids(self) -> list[int]:
+        return [row[0] for row in self.conn.execute("SELECT id FROM games ORDER BY id")]
+
+    def total_pages(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(page_count), 0) FROM games").fetchone()[0]
+
+    def iter_games(self, start: int = 0, end: int = None, status: str = None) -> Iterator[tuple[int, str, int]]:
+        """Yield (id, link, page_count) for games with start <= id < end, in ID order."""
+        query = "SELECT id, link, page_count FROM games WHERE id >= ?"
+        params = [start]
+        if end is not None:
+            query += " AND id < ?"
+            params.append(end)
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        yield from self.conn.execute(query + " ORDER BY id", params)
+
+    def set_status(self, game_id: int, status: str):
+        self.conn.execute(
+            "UPDATE games SET status = ?, updated_at = ? WHERE id = ?",
+            (status, datetime.utcnow().isoformat(), game_id)
+        )
+
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AimdLimiter:
+    """
+    Concurrency limit tuned at runtime by additive increase / multiplicative decrease.
+
+    Outcomes are judged once per window of `limit` completed requests: a window with no
+    congestion signal and an average latency under `target_latency` raises the limit by
+    `increase`; a congested or slow window multiplies it by `decrease`. The limit always
+    stays within [floor, ceiling], and every change is logged.
+    """
+
+    def __init__(self, initial: int, floor: int = 1, ceiling: int = None, target_latency: float = 10,
+                 increase: int = 1, decrease: float = 0.5):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling or initial)
+        self.limit = min(max(initial, self.floor), self.ceiling)
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.history = [(time.time(), self.limit)]
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._window_latency = 0.0
+        self._window_count = 0
+        self._window_congested = False
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AimdLimiter":
+        initial = config['max_concurrent']
+        if not config.get('adaptive_concurrency'):
+            return cls(initial, floor=initial, ceiling=initial)
+        return cls(
+            initial,
+            floor=config.get('min_concurrent') or 1,
+            ceiling=config.get('max_concurrent_ceiling') or initial,
+            target_latency=config.get('target_latency') or 10,
+            increase=config.get('concurrency_increase') or 1,
+            decrease=config.get('concurrency_decrease') or 0.5
+        )
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self, latency: float, congested: bool = False):
+        """Return a slot, reporting how long the request took and whether it hit congestion."""
+        async with self._condition:
+            self._in_flight -= 1
+            self._window_latency += latency
+            self._window_count += 1
+            self._window_congested |= congested
+            if self._window_count >= self.limit:
+                self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        average = self._window_latency / self._window_count
+        if self._window_congested or average > self.target_latency:
+            new_limit = max(self.floor, int(self.limit * self.decrease))
+        else:
+            new_limit = min(self.ceiling, self.limit + self.increase)
+
+        if new_limit != self.limit:
+            logger.info(f"Concurrency {self.limit} -> {new_limit} "
+                        f"(average latency {average:.2f}s, congested: {self._window_congested})")
+            self.limit = new_limit
+            self.history.append((time.time(), new_limit))
+        self._window_latency = 0.0
+        self._window_count = 0
+        self._window_congested = False
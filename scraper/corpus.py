@@ -0,0 +1,223 @@
+import json
+import pickle
+import shutil
+import tempfile
+from itertools import groupby
+from pathlib import Path
+from typing import Iterator
+
+COLUMNS = ('game_id', 'page', 'step', 'moves', 'board', 'comment')
+SUFFIXES = {'jsonl': '.jsonl', 'parquet': '.parquet'}
+
+
+def _encode_board(board) -> str:
+    # Parquet needs one type per column, so cell-list boards are stored as JSON text
+    return board if isinstance(board, str) else json.dumps(board)
+
+
+def _decode_board(board: str):
+    return json.loads(board) if board.startswith('[') else board
+
+
+def page_key(file: str) -> tuple[int, int]:
+    """(game_id, page) from a scraped page name such as saved12_3.html."""
+    game_id, page = file.removeprefix("saved").split(".")[0].split("_")
+    return int(game_id), int(page)
+
+
+def shard_paths(directory, fmt: str) -> list[Path]:
+    return sorted(Path(directory).glob(f"part-*{SUFFIXES[fmt]}"))
+
+
+class CorpusWriter:
+    """
+    Appends parsed steps, one row per step, to numbered shards in `directory`.
+
+    Rows are buffered and written as a new shard every `shard_rows` rows; existing shards
+    are never rewritten. A page's rows always land in the same shard, and a page parsed
+    again is simply appended, so readers keep the rows from its latest shard. A page with
+    no steps is recorded as a single row with step -1, so it still counts as parsed.
+    Superseded rows and small shards accumulate until compact_corpus rewrites the corpus.
+    """
+
+    def __init__(self, directory, fmt: str = 'parquet', shard_rows: int = 100000, columns=COLUMNS):
+        if fmt not in SUFFIXES:
+            raise ValueError(f"Unknown corpus format: {fmt}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.shard_rows = shard_rows
+        self.columns = tuple(columns)
+        existing = shard_paths(self.directory, fmt)
+        self._next_shard = int(existing[-1].stem.split('-')[1]) + 1 if existing else 0
+        self._rows = []
+
+    def add_page(self, game_id: int, page: int, steps: list):
+        if not steps:
+            self._rows.append({**dict.fromkeys(self.columns, ''), 'game_id': game_id, 'page': page, 'step': -1})
+        self.add_rows({'game_id': game_id, 'page': page, 'step': step, **step_info}
+                      for step, step_info in enumerate(steps))
+
+    def add_rows(self, rows):
+        """Append rows that already carry their game_id, page and step, all from one page."""
+        self._rows.extend(rows)
+        if len(self._rows) >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        path = self.directory / f"part-{self._next_shard:05d}{SUFFIXES[self.fmt]}"
+        tmp_path = path.with_name(path.name + ".tmp")
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({column: [_encode_board(row[column]) if column == 'board' else row[column]
+                                       for row in self._rows] for column in self.columns})
+            pq.write_table(table, tmp_path, compression='zstd')
+        else:
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps({column: row[column] for column in self.columns}) + "\n" for row in self._rows)
+        tmp_path.replace(path)
+        self._next_shard += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+def _read_shard(path: Path, fmt: str, columns=None, game_ids=None) -> list[dict]:
+    """Rows of one shard, with only `columns` if given, and only the rows of `game_ids` if given."""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        # The filter is applied while reading, so rows of other games are never converted
+        filters = [('game_id', 'in', sorted(game_ids))] if game_ids is not None else None
+        rows = pq.read_table(path, columns=list(columns) if columns else None, filters=filters).to_pylist()
+        for row in rows:
+            if 'board' in row:
+                row['board'] = _decode_board(row['board'])
+        return rows
+    with open(path, 'r') as f:
+        rows = map(json.loads, f)
+        if game_ids is not None:
+            rows = (row for row in rows if row['game_id'] in game_ids)
+        return [{column: row[column] for column in columns} for row in rows] if columns else list(rows)
+
+
+def read_corpus(directory, fmt: str = 'parquet', columns=COLUMNS) -> Iterator[dict]:
+    """Yield rows shard by shard, reading only `columns` (Parquet skips the others on disk)."""
+    for path in shard_paths(directory, fmt):
+        yield from _read_shard(path, fmt, columns)
+
+
+def parsed_pages(directory, fmt: str = 'parquet') -> set[tuple[int, int]]:
+    """(game_id, page) of every page in the corpus."""
+    return {(row['game_id'], row['page']) for row in read_corpus(directory, fmt, columns=('game_id', 'page'))}
+
+
+def compact_corpus(directory, fmt: str = 'parquet', shard_rows: int = 100000, columns=COLUMNS,
+                   threshold: float = 0.25) -> bool:
+    """
+    Rewrite the corpus without superseded rows, into as few shards as they fit in.
+
+    Only done once at least `threshold` of the rows are superseded, or there are more than
+    twice as many shards as needed. Returns whether the corpus was rewritten.
+    """
+    directory = Path(directory)
+    paths = shard_paths(directory, fmt)
+    # (latest shard, rows in it) of every page
+    pages = {}
+    total_rows = 0
+    for shard, path in enumerate(paths):
+        for row in _read_shard(path, fmt, ('game_id', 'page')):
+            key = (row['game_id'], row['page'])
+            latest, count = pages.get(key, (shard, 0))
+            pages[key] = (shard, count + 1 if latest == shard else 1)
+            total_rows += 1
+    live_rows = sum(count for _, count in pages.values())
+    needed_shards = max(1, -(-live_rows // shard_rows))
+    if total_rows - live_rows < threshold * total_rows and len(paths) <= 2 * needed_shards:
+        return False
+
+    build_dir = directory.with_name(directory.name + ".compact")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    writer = CorpusWriter(build_dir, fmt, shard_rows, columns)
+    for shard, path in enumerate(paths):
+        for key, rows in groupby(_read_shard(path, fmt), key=lambda row: (row['game_id'], row['page'])):
+            if pages[key][0] == shard:
+                writer.add_rows(rows)
+    writer.close()
+
+    old_dir = directory.with_name(directory.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    directory.rename(old_dir)
+    build_dir.rename(directory)
+    shutil.rmtree(old_dir)
+    return True
+
+
+def _latest_pages(shard_rows) -> dict[int, dict[int, list]]:
+    """{game_id: {page: [rows]}} from (shard, row) pairs in shard order, keeping each page's latest rows."""
+    games = {}
+    page_shards = {}
+    for shard, row in shard_rows:
+        key = (row['game_id'], row['page'])
+        if page_shards.get(key) != shard:
+            # The first row of a page in a later shard supersedes the page's earlier rows
+            page_shards[key] = shard
+            games.setdefault(row['game_id'], {})[row['page']] = []
+        if row['step'] >= 0:
+            games[row['game_id']][row['page']].append(row)
+    return games
+
+
+def load_pages(directory, fmt: str = 'parquet', game_ids=None) -> dict[int, dict[int, list]]:
+    """
+    Steps of each page, as {game_id: {page: [rows]}}, keeping only each page's latest rows.
+
+    With `game_ids`, only the rows of those games are read, so the result is as big as they are.
+    """
+    return _latest_pages((shard, row) for shard, path in enumerate(shard_paths(directory, fmt))
+                         for row in _read_shard(path, fmt, game_ids=game_ids))
+
+
+def _read_spill(path: Path):
+    if not path.exists():
+        return
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield from pickle.load(f)
+            except EOFError:
+                return
+
+
+def iter_page_batches(directory, fmt: str, batches) -> Iterator[dict[int, dict[int, list]]]:
+    """
+    load_pages for each batch of game IDs in turn, from a single pass over the shards.
+
+    Games land in every shard, so reading each batch's rows straight from the shards would
+    read the corpus once per batch. Instead each shard's rows are spilled to a temporary
+    file per batch, which holds just that batch's rows, in shard order.
+    """
+    directory = Path(directory)
+    batches = [set(batch) for batch in batches]
+    if len(batches) <= 1:
+        yield from (load_pages(directory, fmt, batch) for batch in batches)
+        return
+
+    batch_of = {game_id: i for i, batch in enumerate(batches) for game_id in batch}
+    with tempfile.TemporaryDirectory(prefix=f".{directory.name}-spill-", dir=directory.parent) as spill_dir:
+        spill_paths = [Path(spill_dir) / f"batch-{i:05d}.pickle" for i in range(len(batches))]
+        for shard, path in enumerate(shard_paths(directory, fmt)):
+            spilled = {}
+            for row in _read_shard(path, fmt, game_ids=batch_of.keys()):
+                spilled.setdefault(batch_of[row['game_id']], []).append((shard, row))
+            for i, shard_rows in spilled.items():
+                with open(spill_paths[i], 'ab') as f:
+                    pickle.dump(shard_rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+            del spilled
+        for spill_path in spill_paths:
+            yield _latest_pages(_read_spill(spill_path))
@@ -0,0 +1,142 @@
+from lxml import etree, html as lxml_html
+
+# A raw step is (move cell text, board cell values, comment text), before normalisation
+
+
+def parse_style(style):
+    return {
+        part.split(": ")[0].strip(): part.split(": ")[1].strip().replace("px", "")
+        for part in style.split(";") if ": " in part
+    }
+
+
+def _board_element_values(board_elements, find_img) -> list:
+    board_element_vals = []
+    for ele in board_elements:
+        ele_style_vals = parse_style(ele.get('style', ''))
+        left, top = ele_style_vals.get('left'), ele_style_vals.get('top')
+        if left and top:
+            tmp = {'left': left, 'top': top}
+
+            ele_img = find_img(ele)
+            if ele_img is not None:
+                ele_img_style_vals = parse_style(ele_img.get('style', ''))
+                tmp['left_img'] = ele_img_style_vals.get('left')
+                tmp['top_img'] = ele_img_style_vals.get('top')
+
+            board_element_vals.append(tmp)
+    return board_element_vals
+
+
+class SoupExtractor:
+    """The reference backend: html.parser soup walked with ChessCommentaryGeneration's Utilities."""
+
+    def __init__(self, utils):
+        self._utils = utils
+
+    def _get_board_values(self, soup) -> list:
+        divs = self._utils.getDivOfClass(soup, "cdiag_frame")
+        if not divs:
+            return []
+
+        board = self._utils.getDivOfID(divs[0], "board")
+        board_elements = self._utils.getDivAll(board[0], recursive=False)
+
+        def find_img(ele):
+            ele_img = self._utils.getImgAll(ele)
+            return ele_img[0] if ele_img else None
+
+        return _board_element_values(board_elements, find_img)
+
+    def extract_steps(self, html_doc: str) -> list[tuple[str, list, str]]:
+        soup = self._utils.getSoupFromHTML(html_doc)
+        results = soup.findAll("table", {"class": "dialog"})
+        tmp = results[0]  # Expecting only 1 table of this type
+        results2 = [result for result in tmp.findAll("tr")
+                    if len(result.findAll("td", recursive=False)) == 2
+                    and self._utils.getDivOfClass(result, "cdiag_frame")]
+
+        steps = []
+        for index, result in enumerate(results2):
+            if index % 2 == 1:
+                continue  # Skip every other row to avoid repetitions
+            td_res = result.findAll("td", recursive=False)
+            steps.append((td_res[0].get_text(), self._get_board_values(result), self._utils.soupToText(td_res[1])))
+        return steps
+
+
+def _has_class(tag: str, name: str) -> etree.XPath:
+    return etree.XPath(f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]")
+
+
+class LxmlExtractor:
+    """
+    The same extraction on libxml2's HTML parser, selecting only the nodes it needs with
+    precompiled XPath instead of building and searching a full soup.
+
+    Text follows bs4's `get_text()`, which `soupToText` is taken to match: comments, processing
+    instructions and script/style contents are skipped. On well-formed pages the JSON it produces
+    matches SoupExtractor's, but html.parser and libxml2 repair malformed markup (e.g. unclosed
+    td/tr tags) differently, so the two can disagree. The parser runs both on each page this one
+    has not yet been checked on, keeping SoupExtractor's steps unless they agree.
+    `bench_parser.py --check` runs the same check ahead of time.
+    """
+
+    _dialog_tables = _has_class("//table", "dialog")
+    _frames = _has_class(".//div", "cdiag_frame")
+    _board = etree.XPath(".//div[@id='board']")
+    _first_img = etree.XPath("(.//img)[1]")
+    _skipped_text_tags = {'script', 'style', 'template'}
+
+    def _text(self, element) -> str:
+        parts = []
+
+        def walk(node):
+            if isinstance(node.tag, str) and node.tag not in self._skipped_text_tags:
+                if node.text:
+                    parts.append(node.text)
+                for child in node:
+                    walk(child)
+                    if child.tail:
+                        parts.append(child.tail)
+            # Comments and processing instructions contribute only their tails, added by the parent
+
+        walk(element)
+        return "".join(parts)
+
+    def _get_board_values(self, row) -> list:
+        frames = self._frames(row)
+        if not frames:
+            return []
+
+        board = self._board(frames[0])
+        board_elements = [child for child in board[0] if child.tag == 'div']
+
+        def find_img(ele):
+            ele_img = self._first_img(ele)
+            return ele_img[0] if ele_img else None
+
+        return _board_element_values(board_elements, find_img)
+
+    def extract_steps(self, html_doc: str) -> list[tuple[str, list, str]]:
+        root = lxml_html.document_fromstring(html_doc)
+        tmp = self._dialog_tables(root)[0]  # Expecting only 1 table of this type
+
+        steps = []
+        index = 0
+        for result in tmp.iter('tr'):
+            td_res = [child for child in result if child.tag == 'td']
+            if len(td_res) != 2 or not self._frames(result):
+                continue
+            if index % 2 == 0:  # Skip every other row to avoid repetitions
+                steps.append((self._text(td_res[0]), self._get_board_values(result), self._text(td_res[1])))
+            index += 1
+        return steps
+
+
+def create_extractor(backend: str, utils=None):
+    if backend == 'lxml':
+        return LxmlExtractor()
+    if backend == 'soup':
+        return SoupExtractor(utils)
+    raise ValueError(f"Unknown parse backend: {backend}")
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import hashlib
+import html
+import logging
+import random
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+import chess
+import yaml
+from aiohttp import web
+
+from archive import HtmlArchive
+from catalog import GameCatalog
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_GAMES = 11500  # Approximate number of games in our scraped corpus, i.e. scale 1
+LISTING_PAGE_SIZE = 50
+STEPS_PER_PAGE = 20
+SQUARE_SIZE = 30
+
+# Sprite offsets read back by parser._board_cell_to_info
+PIECE_SPRITE_TOP = {
+    chess.KING: 0,
+    chess.QUEEN: -30,
+    chess.ROOK: -60,
+    chess.KNIGHT: -90,
+    chess.BISHOP: -120,
+    chess.PAWN: -150,
+}
+COLOR_SPRITE_LEFT = {chess.WHITE: 0, chess.BLACK: -30}
+
+COMMENT_WORDS = (
+    "white black knight bishop rook queen king pawn center file diagonal attack defends threatens "
+    "pressure develops castles exchange sacrifice gambit tempo initiative weakness outpost fianchetto "
+    "opening endgame tactic pin fork skewer mate check blunder mistake idea plan strong better good "
+    "the a this that now here which so but and with on to of it is was should could"
+).split()
+
+# Draws every empty #board from its data-fen one diagram at a time, DRAW_DELAY_MS apart, the way
+# pages that build their diagrams in the browser do
+DRAW_BOARDS_SCRIPT = """
+const SPRITE_TOPS = {k: 0, q: -30, r: -60, n: -90, b: -120, p: -150};
+function drawBoard(board) {
+    const ranks = board.dataset.fen.split('/').map(row => row.replace(/\\d/g, n => '.'.repeat(Number(n))));
+    let cells = '';
+    for (let file = 0; file < 8; file++) {
+        for (let rank = 0; rank < 8; rank++) {
+            const letter = ranks[7 - rank][file];
+            let image = '';
+            if (letter !== '.') {
+                const left = letter === letter.toUpperCase() ? 0 : -30;
+                image = `<img src="/img/pieces.png" style="left: ${left}px; top: ${SPRITE_TOPS[letter.toLowerCase()]}px;">`;
+            }
+            cells += `<div style="left: ${file * SQUARE_SIZE}px; top: ${(7 - rank) * SQUARE_SIZE}px;">${image}</div>`;
+        }
+    }
+    board.innerHTML = cells;
+}
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('div.cdiag_frame > #board[data-fen]').forEach(
+        (board, index) => setTimeout(() => drawBoard(board), DRAW_DELAY_MS * (index + 1)));
+});
+"""
+
+
+class SyntheticCorpus:
+    """
+    Deterministic stand-in for the gameknot annotated game listing.
+
+    Every game is generated on demand from `seed` and its number, as a sequence of random
+    legal moves with a generated comment per ply, so any scale can be served or written
+    without holding the corpus in memory. The listing is newest first like the real site.
+    """
+
+    def __init__(self, scale: float = 1.0, seed: int = 0, base_games: int = BASE_GAMES):
+        self.game_count = max(1, round(base_games * scale))
+        self.seed = seed
+
+    @property
+    def listing_page_count(self) -> int:
+        return -(-self.game_count // LISTING_PAGE_SIZE)
+
+    @staticmethod
+    def game_link(number: int) -> str:
+        return f"synthetic-game-{number}?gm={number}"
+
+    def listing(self, page: int) -> list[int]:
+        """Game numbers shown on a listing page, newest first."""
+        newest = self.game_count - 1 - page * LISTING_PAGE_SIZE
+        return list(range(newest, max(newest - LISTING_PAGE_SIZE, -1), -1))
+
+    @lru_cache(maxsize=1024)
+    def game(self, number: int) -> list[tuple[str, chess.Board, str]]:
+        """The (move text, position after the move, comment) of every step of a game."""
+        rng = random.Random(f"{self.seed}:{number}")
+        board = chess.Board()
+        steps = []
+        for _ in range(rng.randint(20, 100)):
+            if board.is_game_over():
+                break
+            move = rng.choice(list(board.legal_moves))
+            move_number = board.fullmove_number
+            dots = "." if board.turn == chess.WHITE else "..."
+            san = board.san(move)
+            board.push(move)
+            comment = " ".join(rng.choice(COMMENT_WORDS) for _ in range(rng.randint(0, 40)))
+            steps.append((f"{move_number}{dots} {san}", board.copy(stack=False), comment.capitalize()))
+        return steps
+
+    def page_count(self, number: int) -> int:
+        return -(-len(self.game(number)) // STEPS_PER_PAGE)
+
+    def game_page(self, number: int, page: int) -> list[tuple[str, chess.Board, str]]:
+        return self.game(number)[page * STEPS_PER_PAGE:(page + 1) * STEPS_PER_PAGE]
+
+
+def render_paginator(base_url: str, param: str, page_count: int) -> str:
+    """Page links followed by a "next" link, so the second-to-last link is the page count."""
+    if page_count <= 1:
+        return ""
+    links = " ".join(f'<a href="{base_url}&amp;{param}={n}">{n + 1}</a>' for n in range(page_count))
+    return (f'<table class="paginator"><tr><td>{links} '
+            f'<a href="{base_url}&amp;{param}=1">next</a></td></tr></table>')
+
+
+def render_board(board: chess.Board, client_side: bool = False) -> str:
+    if client_side:
+        return f'<div class="cdiag_frame"><div id="board" data-fen="{board.board_fen()}"></div></div>'
+    # Cells are emitted file by file (a1, a2, ..., h8), the order the parser assumes
+    cells = []
+    for file in range(8):
+        for rank in range(8):
+            piece = board.piece_at(chess.square(file, rank))
+            style = f"left: {file * SQUARE_SIZE}px; top: {(7 - rank) * SQUARE_SIZE}px;"
+            image = ""
+            if piece:
+                image = (f'<img src="/img/pieces.png" style="left: {COLOR_SPRITE_LEFT[piece.color]}px; '
+                         f'top: {PIECE_SPRITE_TOP[piece.piece_type]}px;">')
+            cells.append(f'<div style="{style}">{image}</div>')
+    return f'<div class="cdiag_frame"><div id="board">{"".join(cells)}</div></div>'
+
+
+def render_page(title: str, body: str, inline_script: str = "") -> str:
+    return (f'<!DOCTYPE html>\n<html><head><title>{html.escape(title)}</title>'
+            f'<link rel="stylesheet" href="/css/site.css">'
+            f'<script src="/js/site.js"></script>'
+            f'{f"<script>{inline_script}</script>" if inline_script else ""}'
+            f'<script src="https://ads.example.com/tag.js"></script></head>'
+            f'<body><div id="header"><img src="/img/logo.png"></div>{body}</body></html>\n')
+
+
+def render_listing(corpus: SyntheticCorpus, page: int) -> str:
+    rows = []
+    for n, number in enumerate(corpus.listing(page)):
+        rows.append(f'<tr class="{"evn_list" if n % 2 == 0 else "odd_list"}">'
+                    f'<td><a href="/user/player{number % 997}">player{number % 997}</a></td>'
+                    f'<td><a href="/annotation.pl/{corpus.game_link(number)}">Synthetic game {number}</a></td>'
+                    f'<td>{corpus.page_count(number)} pages</td></tr>')
+    paginator = render_paginator("/list_annotated.pl?u=all", "p", corpus.listing_page_count)
+    return render_page("Annotated games", f'{paginator}<table class="list">{"".join(rows)}</table>{paginator}')
+
+
+def render_annotation(corpus: SyntheticCorpus, number: int, page: int, client_side: bool = False,
+                      draw_delay: float = 0.1) -> str:
+    """
+    An annotation page. With `client_side`, the diagrams are empty in the HTML and drawn by a script
+    one by one, `draw_delay` seconds apart, so the page only has its boards once rendered in a browser.
+    """
+    rows = []
+    for move_text, board, comment in corpus.game_page(number, page):
+        # The board sits in a nested two-cell row, so every step matches the parser's row
+        # filter twice, just like the real site
+        rows.append(f'<tr><td><table><tr><td>{move_text}</td><td>{render_board(board, client_side)}</td></tr>'
+                    f'</table></td><td>{html.escape(comment)}</td></tr>')
+    paginator = render_paginator(f"/annotation.pl/{corpus.game_link(number)}", "pg", corpus.page_count(number))
+    script = ""
+    if client_side:
+        script = (DRAW_BOARDS_SCRIPT.replace('DRAW_DELAY_MS', str(round(draw_delay * 1000)))
+                  .replace('SQUARE_SIZE', str(SQUARE_SIZE)))
+    return render_page(f"Synthetic game {number}",
+                       f'{paginator}<table class="dialog">{"".join(rows)}</table>{paginator}', script)
+
+
+class FaultInjector:
+    """Adds latency and random failures to every response."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, throttle_rate: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 120):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.responses = Counter()
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        roll = random.random()
+        if roll < self.timeout_rate:
+            await asyncio.sleep(self.hang_seconds)
+        elif roll < self.timeout_rate + self.throttle_rate:
+            self.responses[429] += 1
+            raise web.HTTPTooManyRequests(headers={'Retry-After': '30'})
+        elif roll < self.timeout_rate + self.throttle_rate + self.failure_rate:
+            self.responses[500] += 1
+            raise web.HTTPInternalServerError()
+
+        response = await handler(request)
+        self.responses[response.status] += 1
+        return response
+
+
+def html_response(request, text: str) -> web.Response:
+    etag = f'"{hashlib.sha256(text.encode()).hexdigest()[:16]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers={'ETag': etag})
+    return web.Response(text=text, content_type='text/html', headers={'ETag': etag})
+
+
+def create_app(corpus: SyntheticCorpus, faults: FaultInjector, client_render_rate: float = 0.0,
+               draw_delay: float = 0.1) -> web.Application:
+    """The stand-in site. A `client_render_rate` fraction of annotation pages draw their boards with JS."""
+
+    async def listing(request):
+        page = int(request.query.get('p', 0))
+        if not 0 <= page < corpus.listing_page_count:
+            raise web.HTTPNotFound()
+        return html_response(request, render_listing(corpus, page))
+
+    async def annotation(request):
+        number = int(request.query.get('gm', -1))
+        page = int(request.query.get('pg', 0))
+        if not 0 <= number < corpus.game_count or not 0 <= page < corpus.page_count(number):
+            raise web.HTTPNotFound()
+        # Decided per page rather than per request, so a page renders the same way every time
+        client_side = random.Random(f"{corpus.seed}:{number}:{page}").random() < client_render_rate
+        return html_response(request, render_annotation(corpus, number, page, client_side, draw_delay))
+
+    async def asset(request):
+        return web.Response(body=b"\0" * 2048)
+
+    async def stats(request):
+        return web.json_response({'games': corpus.game_count, 'responses': dict(faults.responses)})
+
+    app = web.Application(middlewares=[faults.middleware])
+    app.router.add_get('/list_annotated.pl', listing)
+    app.router.add_get('/annotation.pl/{slug}', annotation)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/{kind:img|css|js}/{name}', asset)
+    return app
+
+
+def write_corpus(corpus: SyntheticCorpus, config: dict):
+    """Write every annotation page and a matching catalog, as if the corpus had been scraped."""
+    output_dir = Path(config['scrape_output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Stored where the configured storage_format has the scraper store pages
+    archive = HtmlArchive.from_config(config) if config.get('storage_format') == 'archive' else None
+    catalog = GameCatalog(config['catalog_path'])
+    for listing_page in range(corpus.listing_page_count):
+        for number in corpus.listing(listing_page):
+            page_count = corpus.page_count(number)
+            game_id = catalog.add_game(corpus.game_link(number), page_count)
+            for page in range(page_count):
+                name = f"saved{game_id}_{page}"
+                if archive:
+                    archive.put(name, render_annotation(corpus, number, page), game_id, page)
+                else:
+                    (output_dir / f"{name}.html").write_text(render_annotation(corpus, number, page))
+        catalog.commit()
+        logger.info(f"Wrote listing page {listing_page + 1}/{corpus.listing_page_count}")
+    logger.info(f"Wrote {len(catalog)} games with {catalog.total_pages()} pages to "
+                f"{config['archive_dir'] if archive else output_dir}")
+    catalog.close()
+    if archive:
+        archive.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve or write a synthetic gameknot corpus for offline load tests")
+    parser.add_argument('command', choices=['serve', 'generate'])
+    parser.add_argument('--config', default='./config.yaml')
+    parser.add_argument('--scale', type=float, default=1.0, help="Corpus size as a multiple of ours")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean added latency per response (seconds)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of responses that are HTTP 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of responses that are HTTP 429")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument('--client-render-rate', type=float, default=0.0,
+                        help="Fraction of annotation pages whose boards are drawn by JS in the browser")
+    parser.add_argument('--draw-delay', type=float, default=0.1, help="Seconds between client-side diagrams")
+    args = parser.parse_args()
+
+    config = yaml.safe_load(Path(args.config).read_text())
+    corpus = SyntheticCorpus(args.scale, args.seed)
+    if args.command == 'generate':
+        write_corpus(corpus, config)
+        return
+
+    root_url = f"http://{args.host}:{args.port}"
+    print(f"Serving {corpus.game_count} synthetic games; point config.yaml at it with:\n"
+          f'root_url: "{root_url}"\n'
+          f'annotations_url: "{root_url}/list_annotated.pl?u=all"\n'
+          f'game_url: "{root_url}/annotation.pl"')
+    faults = FaultInjector(args.latency, args.failure_rate, args.throttle_rate, args.timeout_rate,
+                           hang_seconds=config['page_timeout'] * 2)
+    web.run_app(create_app(corpus, faults, args.client_render_rate, args.draw_delay),
+                host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import logging
+from pathlib import Path
+from typing import Iterator
+
+from corpus import iter_page_batches, load_pages
+
+logger = logging.getLogger(__name__)
+
+
+def validated_format(config: dict) -> str:
+    return 'parquet' if config.get('parse_output_format') == 'parquet' else 'jsonl'
+
+
+class GameReader:
+    """
+    Reads each game's parsed pages from whichever layout the parser wrote: a columnar
+    corpus, merged per-game records, or one JSON file per page. With `validated`, games
+    come from the validator's corpus instead, which holds only the pages that replayed cleanly.
+
+    iter_games reads a corpus in one pass and hands its games out `reader_batch_games` at a
+    time, so memory is bounded by the batch rather than the corpus.
+    """
+
+    def __init__(self, config: dict, catalog, metrics, validated: bool = False):
+        self.catalog = catalog
+        self.metrics = metrics
+        self.batch_games = config.get('reader_batch_games') or 1000
+        self.input_dir = Path(config['parse_output_dir'])
+        output_format = config.get('parse_output_format') or 'json'
+        if validated:
+            self.corpus_dir, self.corpus_format = Path(config['validated_corpus_dir']), validated_format(config)
+        elif output_format != 'json':
+            self.corpus_dir, self.corpus_format = Path(config['corpus_dir']), output_format
+        else:
+            self.corpus_dir, self.corpus_format = None, None
+        self.validated = validated
+        self.merged_dir = Path(config['merged_output_dir']) if config.get('merge_games') and not self.corpus_dir else None
+
+    def _corpus_game(self, corpus: dict, index: int) -> list[tuple[int, list]]:
+        game_pages = corpus.get(index, {})
+        if self.validated:
+            # Pages that failed validation are stored without steps; the remaining ones are all usable
+            return sorted((page_no, steps) for page_no, steps in game_pages.items() if steps)
+        pages = []
+        for page_no in range(self.catalog.get_page_count(index)):
+            if page_no not in game_pages:
+                self.metrics.inc('missing_pages')
+                logger.error(f"Page {page_no} of game {index} not found in {self.corpus_dir}")
+                break
+            pages.append((page_no, game_pages[page_no]))
+        return pages
+
+    def _load_merged_pages(self, index: int) -> list[tuple[int, list]]:
+        game_path = self.merged_dir / f"game{index}.json"
+        try:
+            with self.metrics.time('read'), open(game_path, 'r') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            self.metrics.inc('missing_games')
+            logger.error(f"File {game_path} not found")
+            return []
+
+        pages = [[] for _ in range(record['page_count'])]
+        for step in record['steps']:
+            pages[step['page']].append(step)
+        # Like the page-by-page layout, a game ends at its first missing page
+        last_page = record['page_count']
+        if record['missing_pages']:
+            last_page = record['missing_pages'][0]
+            self.metrics.inc('missing_pages')
+            logger.error(f"Page {last_page} of game {index} not found")
+        return list(enumerate(pages[:last_page]))
+
+    def _load_page_files(self, index: int) -> list[tuple[int, list]]:
+        pages = []
+        for page_no in range(self.catalog.get_page_count(index)):
+            page_obj_name = self.input_dir / f"saved{index}_{page_no}.json"
+            try:
+                with self.metrics.time('read'), open(page_obj_name, 'r') as f:
+                    pages.append((page_no, json.load(f)))
+            except FileNotFoundError:
+                self.metrics.inc('missing_pages')
+                logger.error(f"File {page_obj_name} not found")
+                break
+        return pages
+
+    def load_game(self, index: int) -> list[tuple[int, list]]:
+        """(page number, steps) for each page of a game, up to its first missing page."""
+        if self.corpus_dir:
+            with self.metrics.time('read'):
+                corpus = load_pages(self.corpus_dir, self.corpus_format, {index})
+            return self._corpus_game(corpus, index)
+        if self.merged_dir:
+            return self._load_merged_pages(index)
+        return self._load_page_files(index)
+
+    def iter_games(self, indices) -> Iterator[tuple[int, list[tuple[int, list]]]]:
+        """(game ID, pages) for each game, in the given order, holding one batch of corpus games at a time."""
+        if not self.corpus_dir:
+            for index in indices:
+                yield index, self.load_game(index)
+            return
+        indices = list(indices)
+        batches = [indices[i:i + self.batch_games] for i in range(0, len(indices), self.batch_games)]
+        corpora = iter_page_batches(self.corpus_dir, self.corpus_format, batches)
+        for batch in batches:
+            with self.metrics.time('read'):
+                corpus = next(corpora)
+            for index in batch:
+                yield index, self._corpus_game(corpus, index)
+        corpora.close()
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import zstandard
+
+
+class HttpCache:
+    """On-disk cache of response bodies, revalidated with ETag / Last-Modified."""
+
+    def __init__(self, cache_dir, compression_level: int = 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = self.cache_dir / key[:2] / key
+        return base.with_suffix('.zst'), base.with_suffix('.json')
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _load_meta(self, url: str) -> dict:
+        body_path, meta_path = self._paths(url)
+        if not (body_path.exists() and meta_path.exists()):
+            return {}
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """Validators to send with the request, if a cached copy exists."""
+        meta = self._load_meta(url)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url: str) -> bytes:
+        """Return the cached body after a 304 Not Modified response."""
+        body_path, _ = self._paths(url)
+        body = self._decompressor.decompress(body_path.read_bytes())
+        self.hits += 1
+        self.bytes_saved += len(body)
+        return body
+
+    def store(self, url: str, body: bytes, etag: str = None, last_modified: str = None):
+        """Record a fresh 200 response; bodies without validators are not cached."""
+        self.misses += 1
+        if not (etag or last_modified):
+            return
+        body_path, meta_path = self._paths(url)
+        self._write_atomic(body_path, self._compressor.compress(body))
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'size': len(body)}
+        self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def summary(self) -> str:
+        return (f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_saved / 1024:.1f} KiB saved")
@@ -0,0 +1,62 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+
+class ScrapeJournal:
+    """
+    Append-only JSONL log of page outcomes.
+
+    Every attempt is appended as one line and the file is fsynced every `fsync_every` records,
+    so a crash loses at most one batch and never corrupts earlier entries. Each writer appends
+    to its own `journal-<worker>.jsonl`; replaying every journal in the directory gives the
+    latest outcome per page.
+    """
+
+    def __init__(self, directory, worker: str = 'main', fsync_every: int = 100):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"journal-{worker}.jsonl"
+        self.fsync_every = max(1, fsync_every)
+        self._file = None
+        self._unsynced = 0
+
+    def replay(self) -> dict[tuple[int, int], bool]:
+        """Return the latest outcome (success or not) of every journaled page."""
+        outcomes = {}
+        for path in sorted(self.directory.glob('journal-*.jsonl')):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from a crash
+                    key = (entry['game_id'], entry['page'])
+                    # A page that succeeded once stays done, even if a later attempt failed
+                    outcomes[key] = outcomes.get(key, False) or entry['ok']
+        return outcomes
+
+    def record(self, game_id: int, page: int, ok: bool, error: str = None):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        entry = {'game_id': game_id, 'page': page, 'ok': ok, 'ts': datetime.utcnow().isoformat()}
+        if error:
+            entry['error'] = error
+        self._file.write(json.dumps(entry) + '\n')
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or not self._unsynced:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,12 +1,17 @@
 import asyncio
-import json
 import logging
+import time
 from pathlib import Path
 
 import yaml
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from bs4 import BeautifulSoup
 
+from catalog import GameCatalog
+from http_cache import HttpCache
+from metrics import Metrics
+from rate_limiter import HostRateLimiter
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,32 +27,54 @@ logger = logging.getLogger(__name__)
 class LinkUpdater:
     def __init__(self, config_path):
         self.config = yaml.safe_load(Path(config_path).read_text())
-        self.links = self._load_previous_links()
+        self.catalog = GameCatalog.from_config(self.config)
+        self.metrics = Metrics.from_config('link_updater', self.config)
+        self.rate_limiter = HostRateLimiter.from_config(self.config)
+        self.discovery_concurrency = max(1, self.config.get('discovery_concurrency', 1))
+        self.http_cache = HttpCache(self.config['http_cache_dir']) if self.config.get('http_cache_enabled') else None
 
     async def __aenter__(self):
-        self.session = ClientSession(timeout=ClientTimeout(total=self.config['page_timeout']))
+        connector = TCPConnector(
+            limit=self.config.get('connection_limit', 20),
+            limit_per_host=self.config.get('connection_limit_per_host', 10),
+            ttl_dns_cache=300
+        )
+        self.session = ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(total=self.config['page_timeout'])
+        )
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.121 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.121 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
         }
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.session.close()
-
-    def _save_links(self):
-        path = Path(self.config['saved_links_path'])
-        Path(path).write_text(json.dumps(self.links, indent=2))
-
-    def _load_previous_links(self) -> dict[str, int]:
-        try:
-            with open(self.config['saved_links_path'], 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+        self.catalog.close()
+
+    async def _fetch(self, url: str) -> bytes:
+        await self.rate_limiter.acquire(url)
+        headers = self.headers
+        if self.http_cache:
+            headers = {**self.headers, **self.http_cache.conditional_headers(url)}
+
+        with self.metrics.time('fetch'):
+            async with self.session.get(url, headers=headers) as response:
+                self.metrics.inc('requests')
+                if response.status == 304 and self.http_cache:
+                    self.metrics.inc('cache_hits')
+                    return self.http_cache.load(url)
+                response.raise_for_status()
+                page = await response.read()
+        self.metrics.inc('bytes_downloaded', len(page))
+        if self.http_cache:
+            self.http_cache.store(url, page, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return page
 
     async def _parse_page(self, url: str) -> BeautifulSoup:
-        async with self.session.get(url, headers=self.headers) as response:
-            page = await response.read()
+        page = await self._fetch(url)
+        with self.metrics.time('parse'):
             return BeautifulSoup(page, 'html.parser', from_encoding='utf-8')
 
     async def get_page_count(self, url: str) -> int:
@@ -55,49 +82,117 @@ class LinkUpdater:
         paginator = soup.find_all('table', class_="paginator")
         return int(paginator[0].find_all('a')[-2].text) if paginator else 1
 
-    async def _fetch_page_links(self, url: str) -> int:
+    async def _fetch_page_links(self, url: str) -> tuple[int, list[str], bool, int]:
+        """
+        Record the new games listed on a listing page.
+
+        Returns the number of new links, every link on the page in listing order,
+        whether the page was already entirely known, and how many page-count lookups failed.
+        """
         root_url = self.config['root_url']
         soup = await self._parse_page(url)
-        count = 0
+        page_links = []
+        new_links = []
         for elem in soup.find_all('tr', ["evn_list", "odd_list"]):
             link = elem.find_all('a')[1].get('href')
             cleaned_link = link.split('/')[-1]
-            if cleaned_link in self.links:
-                logger.info(f"{cleaned_link} already exists, skipping")
+            page_links.append(cleaned_link)
+            if cleaned_link in self.catalog:
+                logger.debug(f"{cleaned_link} already exists, skipping")
+                continue
+            new_links.append((cleaned_link, link))
+
+        # The listing is sorted newest first, so everything after the high-water mark is known.
+        high_water_mark = self.catalog.get_meta('high_water_mark')
+        if high_water_mark in page_links:
+            mark_index = page_links.index(high_water_mark)
+            entirely_known = all(link in self.catalog for link in page_links[mark_index:])
+        else:
+            entirely_known = not new_links
+
+        semaphore = asyncio.Semaphore(self.discovery_concurrency)
+
+        async def bounded_page_count(link):
+            async with semaphore:
+                return await self.get_page_count(f"{root_url}{link}")
+
+        # Page counts are fetched concurrently but recorded in listing order,
+        # so game IDs keep following discovery order.
+        page_counts = await asyncio.gather(*(bounded_page_count(link) for _, link in new_links),
+                                           return_exceptions=True)
+        count = 0
+        failed_lookups = 0
+        for (cleaned_link, _), page_count in zip(new_links, page_counts):
+            if isinstance(page_count, Exception):
+                logger.error(f"Failed to get page count for {cleaned_link}: {page_count}")
+                self.metrics.inc('page_count_errors')
+                failed_lookups += 1
                 continue
-
-            page_count = await self.get_page_count(f"{root_url}{link}")
             logger.info(f"Found new link: {cleaned_link} with {page_count} pages")
-
-            self.links[cleaned_link] = page_count
-            await asyncio.sleep(self.config['request_delay'])
+            self.catalog.add_game(cleaned_link, page_count)
             count += 1
-        return count
+        with self.metrics.time('write'):
+            self.catalog.commit()
+        self.metrics.inc('links_discovered', count)
+        return count, page_links, entirely_known, failed_lookups
 
-    def get_game_links(self):
-        return self.links
+    def get_catalog(self) -> GameCatalog:
+        return self.catalog
 
     async def update_game_links(self):
         annotations_url = self.config['annotations_url']
         nav_page_count = await self.get_page_count(annotations_url)
-        await asyncio.sleep(self.config['request_delay'])
 
+        incremental = self.config.get('incremental_update', False)
+        overlap_pages = max(1, self.config.get('incremental_overlap_pages', 1))
+
+        start_time = time.monotonic()
+        total_count = 0
+        known_streak = 0
+        newest_link = None
+        failed = False
         for i in range(nav_page_count):
             page_url = f"{annotations_url}&p={i}"
             try:
-                count = await self._fetch_page_links(page_url)
-                self._save_links()
-                logger.info(f"Fetched {count} links from page {i}")
-                await asyncio.sleep(self.config['request_delay'])
+                count, page_links, entirely_known, failed_lookups = await self._fetch_page_links(page_url)
+                # A game whose page count could not be looked up is not recorded yet
+                failed = failed or failed_lookups > 0
+                if newest_link is None and page_links:
+                    newest_link = page_links[0]
+                total_count += count
+                elapsed = max(time.monotonic() - start_time, 1e-6)
+                logger.info(f"Fetched {count} links from page {i} "
+                            f"({total_count / elapsed:.2f} links/sec overall)")
             except Exception as e:
                 logger.error(f"Failed to fetch {page_url}: {e}")
+                self.metrics.inc('listing_page_errors')
+                failed = True
+                continue
+
+            known_streak = known_streak + 1 if entirely_known else 0
+            if incremental and known_streak >= overlap_pages:
+                logger.info(f"Page {i} is entirely known, stopping after {i + 1} of {nav_page_count} pages")
+                break
+
+        # Only advance the mark after a clean pass, so failed pages and games are revisited next time.
+        if newest_link and not failed:
+            self.catalog.set_meta('high_water_mark', newest_link)
+            self.catalog.commit()
+
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        logger.info(f"Discovered {total_count} links in {elapsed:.1f}s "
+                    f"({total_count / elapsed:.2f} links/sec)")
+        if self.http_cache:
+            logger.info(self.http_cache.summary())
+        summary = self.metrics.write()
+        logger.info(f"Slowest stage: {summary['bottleneck_stage']}")
 
 
 async def main():
     async with LinkUpdater("./config.yaml") as updater:
         # await updater.update_game_links()
-        links = updater.get_game_links()
-        print(f"Found {len(links)} links with {sum(links.values())} total pages")
+        catalog = updater.get_catalog()
+        print(f"Found {len(catalog)} links with {catalog.total_pages()} total pages")
 
 
 if __name__ == "__main__":
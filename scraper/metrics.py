@@ -0,0 +1,165 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Counters and per-stage latency histograms for one pipeline component.
+
+    `write()` exports them as a Prometheus textfile (for node_exporter's textfile collector)
+    and as a JSON run summary that names the stage with the most total time.
+    """
+
+    def __init__(self, component: str, output_dir=None):
+        self.component = component
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.counters: dict[str, float] = {}
+        self.stages: dict[str, Histogram] = {}
+        self.started_at = datetime.utcnow()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, component: str, config: dict) -> "Metrics":
+        return cls(component, config.get('metrics_dir'))
+
+    def inc(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def drain(self) -> tuple[dict, dict]:
+        """Return and reset the counters and histograms, e.g. to ship them out of a worker process."""
+        with self._lock:
+            counters, stages = self.counters, self.stages
+            self.counters, self.stages = {}, {}
+        return counters, stages
+
+    def merge(self, counters: dict, stages: dict):
+        """Fold in counters and histograms returned by `drain()`."""
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, histogram in stages.items():
+                if stage in self.stages:
+                    self.stages[stage].merge(histogram)
+                else:
+                    self.stages[stage] = histogram
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': histogram.count,
+                    'total_seconds': round(histogram.sum, 6),
+                    'mean_seconds': round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                    'p50_seconds': histogram.quantile(0.5),
+                    'p95_seconds': histogram.quantile(0.95),
+                    'max_seconds': round(histogram.max, 6),
+                }
+                for stage, histogram in self.stages.items()
+            }
+            counters = dict(self.counters)
+        bottleneck = max(stages, key=lambda stage: stages[stage]['total_seconds']) if stages else None
+        return {
+            'component': self.component,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(time.monotonic() - self._started, 3),
+            'counters': counters,
+            'stages': stages,
+            'bottleneck_stage': bottleneck,
+        }
+
+    def to_prometheus(self) -> str:
+        # Worker names may be host names, whose dots and dashes are not allowed in metric names
+        prefix = f"chess_{re.sub(r'[^a-zA-Z0-9_]', '_', self.component)}"
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+            if self.stages:
+                lines.append(f"# HELP {prefix}_stage_seconds Time spent per pipeline stage")
+                lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f"{prefix}_duration_seconds {time.monotonic() - self._started}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write_atomic(path: Path, text: str):
+        # The textfile collector may read at any time, so never expose a partial file
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(text)
+        os.replace(tmp_path, path)
+
+    def write(self):
+        """Export the Prometheus textfile and JSON summary, returning the summary."""
+        summary = self.summary()
+        if self.output_dir:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self._write_atomic(self.output_dir / f"{self.component}.prom", self.to_prometheus())
+            self._write_atomic(self.output_dir / f"{self.component}.json", json.dumps(summary, indent=2))
+        return summary
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media')
+
+
+class PagePool:
+    """
+    Reusable Playwright pages, each in its own browser context.
+
+    When resource blocking is enabled, every context aborts requests for the blocked
+    resource types and for scripts served from outside `first_party_domain`, since the
+    parser only needs the server-rendered markup and inline styles.
+    """
+
+    def __init__(self, browser, size: int, reuse: bool = True, block_resources: bool = True,
+                 blocked_resource_types=DEFAULT_BLOCKED_RESOURCE_TYPES, first_party_domain: str = None):
+        self.browser = browser
+        self.reuse = reuse
+        self.block_resources = block_resources
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.first_party_domain = first_party_domain
+        self.blocked_requests = 0
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(size)
+
+    @classmethod
+    def from_config(cls, browser, config: dict, size: int = None) -> "PagePool":
+        return cls(
+            browser,
+            size=size or config['max_concurrent'],
+            reuse=config.get('reuse_pages', True),
+            block_resources=config.get('block_resources', True),
+            blocked_resource_types=config.get('blocked_resource_types') or DEFAULT_BLOCKED_RESOURCE_TYPES,
+            first_party_domain=urlsplit(config['root_url']).hostname
+        )
+
+    def _is_blocked(self, request) -> bool:
+        if request.resource_type in self.blocked_resource_types:
+            return True
+        if request.resource_type == 'script' and self.first_party_domain:
+            host = urlsplit(request.url).hostname or ''
+            return not (host == self.first_party_domain or host.endswith(f".{self.first_party_domain}"))
+        return False
+
+    async def _route(self, route):
+        if self._is_blocked(route.request):
+            self.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_page(self):
+        context = await self.browser.new_context()
+        if self.block_resources:
+            await context.route('**/*', self._route)
+        return await context.new_page()
+
+    @staticmethod
+    async def _discard(page):
+        await page.context.close()
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a page; pages that raised are discarded rather than returned to the pool."""
+        async with self._semaphore:
+            page = self._idle.pop() if self._idle else await self._new_page()
+            healthy = False
+            try:
+                yield page
+                healthy = True
+            finally:
+                if healthy and self.reuse and not page.is_closed():
+                    self._idle.append(page)
+                else:
+                    await self._discard(page)
+
+    async def close(self):
+        while self._idle:
+            await self._discard(self._idle.pop())
@@ -0,0 +1,89 @@
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed (
+    name TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    parser_version TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    parsed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backend_checks (
+    content_hash TEXT NOT NULL,
+    backend_version TEXT NOT NULL,
+    checked_at TEXT NOT NULL,
+    PRIMARY KEY (content_hash, backend_version)
+);
+"""
+
+
+class ParseManifest:
+    """
+    Records the content hash and parser version each input page was last parsed with,
+    so a parse run only redoes pages whose HTML or parser changed.
+
+    For loose HTML files the size and mtime are kept too, and the stored hash is reused
+    while they are unchanged, so unchanged files are not re-read just to be hashed.
+
+    It also records which page contents a faster backend was found to parse exactly like the
+    reference one, by the parser or `bench_parser.py --check`, since malformed markup can be
+    repaired differently.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._entries = {row[0]: row[1:] for row in self.conn.execute(
+            "SELECT name, content_hash, parser_version, size, mtime_ns FROM parsed")}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ParseManifest":
+        return cls(config.get('parse_manifest_path') or Path(config['parse_output_dir']) / 'manifest.sqlite3')
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def file_hash(self, name: str, path: Path) -> tuple[str, int, int]:
+        """(content hash, size, mtime_ns) of a file, hashing it only if it changed since it was recorded."""
+        stat = path.stat()
+        entry = self._entries.get(name)
+        if entry and entry[2] == stat.st_size and entry[3] == stat.st_mtime_ns:
+            return entry[0], stat.st_size, stat.st_mtime_ns
+        return hashlib.sha256(path.read_bytes()).hexdigest(), stat.st_size, stat.st_mtime_ns
+
+    def is_current(self, name: str, content_hash: str, parser_version: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry[0] == content_hash and entry[1] == parser_version
+
+    def unchecked(self, content_hashes, backend_version: str) -> set[str]:
+        """The content hashes that have not passed a backend check with this backend version."""
+        checked = {row[0] for row in self.conn.execute(
+            "SELECT content_hash FROM backend_checks WHERE backend_version = ?", (backend_version,))}
+        return set(content_hashes) - checked
+
+    def record_check(self, content_hashes, backend_version: str):
+        checked_at = datetime.utcnow().isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO backend_checks (content_hash, backend_version, checked_at) VALUES (?, ?, ?)",
+            [(content_hash, backend_version, checked_at) for content_hash in content_hashes]
+        )
+
+    def record(self, name: str, content_hash: str, parser_version: str, size: Optional[int] = None,
+               mtime_ns: Optional[int] = None):
+        self._entries[name] = (content_hash, parser_version, size, mtime_ns)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parsed (name, content_hash, parser_version, size, mtime_ns, parsed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, content_hash, parser_version, size, mtime_ns, datetime.utcnow().isoformat())
+        )
@@ -1,6 +1,7 @@
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 import unicodedata
@@ -8,6 +9,21 @@ import yaml
 
 from ChessCommentaryGeneration.Data.crawler.utilities import Utilities
 
+from archive import HtmlArchive
+from board_codec import cells_to_fen
+from catalog import GameCatalog
+from corpus import CorpusWriter, compact_corpus, page_key, parsed_pages
+from extractors import create_extractor
+from metrics import Metrics
+from parse_manifest import ParseManifest
+from validator import validate_corpus
+
+# Bump whenever a change to the parser alters its output, so every page is parsed again
+PARSER_VERSION = "2"
+
+# The backend every other one must agree with before it is trusted with a page
+REFERENCE_BACKEND = 'soup'
+
 
 def _board_cell_to_info(list_of_board_cells):
     ret = []
@@ -40,111 +56,269 @@ def _board_cell_to_info(list_of_board_cells):
     return ret
 
 
-# TODO: combine multi-page games into single json
+# Set in each parse worker process by _init_worker
+_worker_collector = None
+
+
+def _init_worker(config):
+    global _worker_collector
+    _worker_collector = DataCollector(config)
+
+
+def _parse_chunk_in_worker(chunk):
+    """Parse a chunk of files with this process's collector, returning its results and metrics."""
+    results = _worker_collector.parse_chunk(chunk)
+    return results, _worker_collector.metrics.drain()
+
+
 class DataCollector:
     def __init__(self, config):
+        self.config = config
         self._utils = Utilities()
         self.input_dir = Path(config['scrape_output_dir'])
         self.output_dir = Path(config['parse_output_dir'])
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.parse_error_file = Path(config['parse_error_path'])
+        self.output_format = config.get('parse_output_format') or 'json'
+        self.corpus_dir = Path(config['corpus_dir']) if self.output_format != 'json' else None
+        self.merged_dir = Path(config['merged_output_dir']) if config.get('merge_games') and not self.corpus_dir else None
+        self.archive = HtmlArchive.from_config(config) if config.get('storage_format') == 'archive' else None
+        self.metrics = Metrics.from_config('parser', config)
+        self.board_format = config.get('board_format') or 'cells'
+        self.backend = config.get('parse_backend') or REFERENCE_BACKEND
+        self.extractor = create_extractor(self.backend, self._utils)
+        self.reference_extractor = (create_extractor(REFERENCE_BACKEND, self._utils)
+                                    if self.backend != REFERENCE_BACKEND else None)
+        self.executor_type = config.get('parse_executor') or 'process'
+        self.workers = config.get('parse_workers') or os.cpu_count()
+        self.chunk_size = config.get('parse_chunk_size') or 32
+        # Settings that change the output are part of the version pages are recorded with
+        self.parser_version = f"{self.backend_version(self.backend)}-{self.output_format}"
+        self.manifest = None
+        self._input_states = {}
+
+    def backend_version(self, backend: str) -> str:
+        """Version of the steps a backend extracts, which bench_parser.py checks are recorded with."""
+        return f"{PARSER_VERSION}-{backend}-{self.board_format}"
 
     def _get_input_files(self) -> list:
+        if self.archive:
+            return [f"{name}.html" for name in self.archive.names()]
         return [f for f in os.listdir(self.input_dir) if f.endswith(".html")]
 
-    def _get_board_values(self, soup) -> list:
-        divs = self._utils.getDivOfClass(soup, "cdiag_frame")
-        if not divs:
-            return []
-
-        board = self._utils.getDivOfID(divs[0], "board")
-        board_elements = self._utils.getDivAll(board[0], recursive=False)
-        board_element_vals = []
-
-        def parse_style(style):
-            return {
-                part.split(": ")[0].strip(): part.split(": ")[1].strip().replace("px", "")
-                for part in style.split(";") if ": " in part
+    def _read_input_file(self, file) -> str:
+        if self.archive:
+            return self.archive.get(file.removesuffix(".html"))
+        with open(os.path.join(self.input_dir, file), "r", encoding="utf-8") as html_file:
+            return html_file.read()
+
+    def parse_html(self, html_doc: str, extractor=None) -> list:
+        all_steps_info = []
+        for move_text, board_element_vals, comment in (extractor or self.extractor).extract_steps(html_doc):
+            moves = (unicodedata.normalize('NFKD', move_text)
+                     .encode('ascii', 'ignore')
+                     .decode('utf-8'))
+            moves = moves.split('<!--', 1)[0].strip()
+
+            board = cells_to_fen(board_element_vals) if self.board_format == 'fen' else None
+            if board is None:
+                board = _board_cell_to_info(board_element_vals)
+
+            # Compile step info
+            current_step_info = {
+                "moves": moves,
+                "board": board,
+                "comment": comment
             }
-
-        for ele in board_elements:
-            ele_style_vals = parse_style(ele.get('style', ''))
-            left, top = ele_style_vals.get('left'), ele_style_vals.get('top')
-            if left and top:
-                tmp = {'left': left, 'top': top}
-
-                ele_img = self._utils.getImgAll(ele)
-                if ele_img:
-                    ele_img_style_vals = parse_style(ele_img[0].get('style', ''))
-                    tmp['left_img'] = ele_img_style_vals.get('left')
-                    tmp['top_img'] = ele_img_style_vals.get('top')
-
-                board_element_vals.append(tmp)
-
-        return board_element_vals
-
-    def process_file(self, file):
+            all_steps_info.append(current_step_info)
+        return all_steps_info
+
+    def _output_path(self, file) -> Path:
+        return self.output_dir / file.replace(".html", ".json")
+
+    def _parse_checked(self, html_doc: str) -> tuple[list, bool]:
+        """
+        Parse a page the backend has not been checked on with both it and the reference backend,
+        returning the reference steps and whether the two agreed.
+        """
+        all_steps_info = self.parse_html(html_doc, self.reference_extractor)
+        try:
+            agreed = self.parse_html(html_doc) == all_steps_info
+        except Exception:
+            agreed = False
+        self.metrics.inc('backend_checks')
+        if not agreed:
+            self.metrics.inc('backend_mismatches')
+        return all_steps_info, agreed
+
+    def process_file(self, file, check: bool = False):
+        """
+        Parse one page, returning (file, error, steps, checked); steps are only returned for corpus
+        output, and checked is whether `check` found the backend agrees with the reference on it.
+        """
+        checked = False
         try:
             print(f"Processing file {file}")
-            file_path = os.path.join(self.input_dir, file)
-
-            output_file_path = os.path.join(self.output_dir, file.replace(".html", ".json"))
-            if os.path.exists(output_file_path):
-                return file, None
-
-            with open(file_path, "r", encoding="utf-8") as html_file:
-                html_doc = html_file.read()
-
-            soup = self._utils.getSoupFromHTML(html_doc)
-            results = soup.findAll("table", {"class": "dialog"})
-            tmp = results[0]  # Expecting only 1 table of this type
-            results2 = [result for result in tmp.findAll("tr")
-                        if len(result.findAll("td", recursive=False)) == 2
-                        and self._utils.getDivOfClass(result, "cdiag_frame")]
-
-            all_steps_info = []
-            for index, result in enumerate(results2):
-                if index % 2 == 1:
-                    continue  # Skip every other row to avoid repetitions
-
-                # Extract move information
-                td_res = result.findAll("td", recursive=False)
-                move_text = td_res[0].get_text()
-                moves = (unicodedata.normalize('NFKD', move_text)
-                         .encode('ascii', 'ignore')
-                         .decode('utf-8'))
-                moves = moves.split('<!--', 1)[0].strip()
-
-                # Extract board information
-                board_element_vals = self._get_board_values(result)
-                board_element_info = _board_cell_to_info(board_element_vals)
-
-                # Extract comment
-                comment = self._utils.soupToText(td_res[1])
-
-                # Compile step info
-                current_step_info = {
-                    "moves": moves,
-                    "board": board_element_info,
-                    "comment": comment
-                }
-                all_steps_info.append(current_step_info)
-
-            with open(output_file_path, "w") as output_file:
+            with self.metrics.time('read'):
+                html_doc = self._read_input_file(file)
+            parse_start = time.monotonic()
+            if check and self.reference_extractor:
+                all_steps_info, checked = self._parse_checked(html_doc)
+            else:
+                all_steps_info = self.parse_html(html_doc)
+            self.metrics.observe('parse', time.monotonic() - parse_start)
+            self.metrics.inc('files_parsed')
+            self.metrics.inc('steps', len(all_steps_info))
+
+            if self.corpus_dir:
+                return file, None, all_steps_info, checked
+            with self.metrics.time('write'), open(self._output_path(file), "w") as output_file:
                 json.dump(all_steps_info, output_file)
         except Exception as e:
-            return file, str(e)
-        return file, None  # Success
+            self.metrics.inc('parse_errors')
+            return file, str(e), None, False
+        return file, None, None, checked  # Success
+
+    def parse_chunk(self, chunk) -> list:
+        """Parse each (file, check) of a chunk."""
+        return [self.process_file(file, check) for file, check in chunk]
+
+    def _input_state(self, file) -> tuple:
+        """(content hash, size, mtime_ns) of an input page; the archive already knows its hashes."""
+        if self.archive:
+            return self.archive.content_hash(file.removesuffix(".html")), None, None
+        return self.manifest.file_hash(file, self.input_dir / file)
+
+    def _pending_files(self) -> list:
+        """Inputs that changed, were parsed by another parser version, or whose output is missing."""
+        all_files = sorted(self._get_input_files())
+        done = parsed_pages(self.corpus_dir, self.output_format) if self.corpus_dir else None
+        pending = []
+        for file in all_files:
+            state = self._input_state(file)
+            output_exists = page_key(file) in done if self.corpus_dir else self._output_path(file).exists()
+            if not output_exists or not self.manifest.is_current(file, state[0], self.parser_version):
+                self._input_states[file] = state
+                pending.append(file)
+        self.metrics.inc('files_skipped', len(all_files) - len(pending))
+        return pending
+
+    def _unchecked_files(self, files: list) -> set:
+        """Pages a non-reference backend has not been checked against the reference on."""
+        if self.backend == REFERENCE_BACKEND:
+            return set()
+        unchecked = self.manifest.unchecked({self._input_states[file][0] for file in files},
+                                            self.backend_version(self.backend))
+        return {file for file in files if self._input_states[file][0] in unchecked}
 
     def parse_data(self):
-        all_files = self._get_input_files()
-        with ThreadPoolExecutor() as executor, open(self.parse_error_file, "w") as fw:
-            futures = {executor.submit(self.process_file, file): file for file in all_files}
-            for future in as_completed(futures):
-                file, error = future.result()
-                if error:
-                    fw.write(f"{file}: {error}\n")
-                    print(f"Error processing file {file}: {error}")
+        self.manifest = ParseManifest.from_config(self.config)
+        all_files = self._pending_files()
+        # Unchecked pages are parsed with the reference backend too, and keep its steps unless both agree
+        unchecked = self._unchecked_files(all_files)
+        work = [(file, file in unchecked) for file in all_files]
+        chunks = [work[i:i + self.chunk_size] for i in range(0, len(work), self.chunk_size)]
+        if self.executor_type == 'process':
+            # Each worker process builds its own Utilities and archive reader once, in _init_worker
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.config,))
+            parse_chunk = _parse_chunk_in_worker
+        else:
+            executor = ThreadPoolExecutor(self.workers)
+            parse_chunk = self.parse_chunk
+
+        writer = None
+        if self.corpus_dir:
+            writer = CorpusWriter(self.corpus_dir, self.output_format, self.config.get('corpus_shard_rows') or 100000)
+
+        parsed_games = set()
+        checked_hashes = set()
+        start_time = time.monotonic()
+        # map yields chunks in submission order, so errors are reported in file order
+        with executor, open(self.parse_error_file, "w") as fw:
+            for result in executor.map(parse_chunk, chunks):
+                if self.executor_type == 'process':
+                    result, worker_metrics = result
+                    self.metrics.merge(*worker_metrics)
+                for file, error, steps, checked in result:
+                    if error:
+                        fw.write(f"{file}: {error}\n")
+                        print(f"Error processing file {file}: {error}")
+                        continue
+                    if writer:
+                        with self.metrics.time('write'):
+                            writer.add_page(*page_key(file), steps)
+                    parsed_games.add(page_key(file)[0])
+                    content_hash, size, mtime_ns = self._input_states.pop(file)
+                    self.manifest.record(file, content_hash, self.parser_version, size, mtime_ns)
+                    if checked:
+                        checked_hashes.add(content_hash)
+                # Corpus rows are buffered until a shard is written, so their entries wait for the close
+                if not writer:
+                    self.manifest.commit()
+            if writer:
+                writer.close()
+        if checked_hashes:
+            self.manifest.record_check(checked_hashes, self.backend_version(self.backend))
+        self.manifest.commit()
+        self.manifest.close()
+        if writer and compact_corpus(self.corpus_dir, self.output_format, writer.shard_rows,
+                                     threshold=self.config.get('corpus_compact_threshold') or 0.25):
+            print(f"Compacted {self.corpus_dir}")
+
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        print(f"Parsed {len(all_files)} files in {elapsed:.1f}s ({len(all_files) / elapsed:.1f} files/sec) "
+              f"with {self.workers} {self.executor_type} workers")
+        if self.merged_dir:
+            self.merge_games()
+        self.metrics.write()
+        if self.config.get('validate_moves'):
+            # Only games with a page parsed again can have changed since they were last validated
+            validate_corpus(self.config, parsed_games)
+
+    def _merge_game(self, game_id: int, link: str, page_count: int, page_paths: list) -> dict:
+        steps, missing_pages = [], []
+        for page, page_path in enumerate(page_paths):
+            try:
+                with open(page_path, "r") as page_file:
+                    page_steps = json.load(page_file)
+            except FileNotFoundError:
+                missing_pages.append(page)
+                continue
+            steps.extend({"page": page, "step": step, **step_info} for step, step_info in enumerate(page_steps))
+        return {
+            "game_id": game_id,
+            "link": link,
+            "page_count": page_count,
+            "missing_pages": missing_pages,
+            "steps": steps
+        }
+
+    def merge_games(self):
+        """Combine each game's parsed pages into one record, in page order, skipping games that are up to date."""
+        self.merged_dir.mkdir(parents=True, exist_ok=True)
+        catalog = GameCatalog.from_config(self.config)
+        merged = 0
+        try:
+            for game_id, link, page_count in catalog.iter_games():
+                page_paths = [self.output_dir / f"saved{game_id}_{page}.json" for page in range(page_count)]
+                page_mtimes = [path.stat().st_mtime for path in page_paths if path.exists()]
+                if not page_mtimes:
+                    continue
+                merged_path = self.merged_dir / f"game{game_id}.json"
+                if merged_path.exists() and merged_path.stat().st_mtime >= max(page_mtimes):
+                    continue
+
+                with self.metrics.time('merge'):
+                    record = self._merge_game(game_id, link, page_count, page_paths)
+                    tmp_path = merged_path.with_name(merged_path.name + ".tmp")
+                    with open(tmp_path, "w") as merged_file:
+                        json.dump(record, merged_file)
+                    os.replace(tmp_path, merged_path)
+                merged += 1
+        finally:
+            catalog.close()
+        self.metrics.inc('games_merged', merged)
+        print(f"Merged {merged} games into {self.merged_dir}")
 
 
 def main():
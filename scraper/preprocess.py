@@ -1,12 +1,19 @@
 import json
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 import yaml
-from nltk.tokenize import word_tokenize
 
-os.mkdir("./logs")
+from board_codec import board_pieces
+from catalog import GameCatalog
+from game_reader import GameReader
+from metrics import Metrics
+from tokenizer import create_tokenizer, normalize_comment
+
+os.makedirs("./logs", exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -76,17 +83,36 @@ def parse_move_string(moves: str) -> list:
     return move_sequence
 
 
+# Set in each preprocessing worker process by _init_worker
+_worker_preprocess = None
+
+
+def _init_worker(config):
+    global _worker_preprocess
+    _worker_preprocess = Preprocess(config)
+
+
+def _format_chunk_in_worker(chunk):
+    """Format a chunk of games with this process's Preprocess, returning its lines and metrics."""
+    results = [_worker_preprocess.format_game(key, index, pages) for key, index, pages in chunk]
+    return results, _worker_preprocess.metrics.drain()
+
+
 class Preprocess:
     def __init__(self, config):
-        self.input_dir = Path(config['parse_output_dir'])
+        self.config = config
         self.output_dir = Path(config['preprocess_output_dir'])
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self._split_data_path = Path(config['split_data_path'])
-        self._all_links_path = Path(config['saved_links_path'])
         self._start_state_path = Path(config['start_state_path'])
         self.split_data: dict[str, list[int]] = self.load_split_data()
-        self.link_page_counts = self.load_link_page_counts()
+        self.catalog = GameCatalog.from_config(config)
+        self.metrics = Metrics.from_config('preprocess', config)
         self.start_state = self.load_start_state()
+        self.reader = GameReader(config, self.catalog, self.metrics, validated=bool(config.get('validate_moves')))
+        self.workers = config.get('preprocess_workers') or os.cpu_count()
+        self.chunk_size = config.get('preprocess_chunk_size') or 16
+        self.tokenize = create_tokenizer(config.get('comment_tokenizer') or 'nltk')
 
     def load_start_state(self):
         if self._start_state_path.exists():
@@ -94,13 +120,6 @@ class Preprocess:
                 return json.load(f)
         return {}
 
-    def load_link_page_counts(self) -> list[int]:
-        if self._all_links_path.exists():
-            with open(self._all_links_path, 'r') as f:
-                data = json.load(f)
-                return list(data.values())
-        return []
-
     def load_split_data(self):
         split_data = {}
         if self._split_data_path.exists():
@@ -108,59 +127,81 @@ class Preprocess:
                 split_data = json.load(f)
         return split_data
 
+    def load_game(self, index: int) -> list[tuple[int, list]]:
+        """(page number, steps) for each page of a game, up to its first missing page."""
+        return self.reader.load_game(index)
+
+    def format_game(self, key: str, index: int, pages: list[tuple[int, list]]) -> list[tuple[str, str, bool]]:
+        """(source line, target line, whether it is a single move) for every step of a game."""
+        lines = []
+        for page_no, data in pages:
+            logger.info(f"Processing [{key}] - {index}_{page_no}")
+
+            start_state = self.start_state
+            for elem in data:
+                moves = elem['moves']
+                board_state = elem['board']
+                comment = normalize_comment(elem['comment'])
+                with self.metrics.time('tokenize'):
+                    comment_words = " ".join(self.tokenize(comment))
+                current_state_str = " ".join(board_pieces(board_state))
+                start_state_str = " ".join(board_pieces(start_state['board']))
+                move_sequence = parse_move_string(moves)
+                src_str = f"{current_state_str} <EOC> {start_state_str} <EOP> {' '.join(move_sequence)} <EOMH>"
+                tgt_str = comment_words
+                lines.append((src_str, tgt_str, len(move_sequence) == 1))
+                self.metrics.inc('steps')
+
+                start_state = elem
+        return lines
+
+    def _iter_formatted(self, key: str, indices: list[int], executor):
+        """Formatted lines of each game, in split order, a bounded number of chunks at a time."""
+        games = ((key, index, pages) for index, pages in self.reader.iter_games(indices))
+        chunks = iter(lambda: list(islice(games, self.chunk_size)), [])
+        if executor is None:
+            for chunk in chunks:
+                for key, index, pages in chunk:
+                    yield self.format_game(key, index, pages)
+            return
+
+        while batch := list(islice(chunks, self.workers * 4)):
+            for results, worker_metrics in executor.map(_format_chunk_in_worker, batch):
+                self.metrics.merge(*worker_metrics)
+                yield from results
+
     def process(self):
-        for key, indices in self.split_data.items():
-            logger.info(f"Processing {key}")
-
-            out_file_multi_che = self.output_dir / f"{key}.che-eng.multi.che"
-            out_file_multi_en = self.output_dir / f"{key}.che-eng.multi.en"
-            out_file_single_che = self.output_dir / f"{key}.che-eng.single.che"
-            out_file_single_en = self.output_dir / f"{key}.che-eng.single.en"
-
-            multi_che, multi_en, single_che, single_en = [], [], [], []
-
-            for index in indices:
-                page_length = self.link_page_counts[index]
-                for page_no in range(page_length):
-                    logger.info(f"Processing [{key}] - {index}_{page_no}")
-
-                    page_obj_name = self.input_dir / f"saved{index}_{page_no}.json"
-                    try:
-                        with open(page_obj_name, 'r') as f:
-                            data = json.load(f)
-                    except FileNotFoundError:
-                        logger.error(f"File {page_obj_name} not found")
-                        break
-
-                    start_state = self.start_state
-                    for elem in data:
-                        moves = elem['moves']
-                        board_state = elem['board']
-                        comment = elem['comment'].encode('ascii', 'replace').strip().decode('ascii')
-                        comment_words = " ".join(word_tokenize(comment))
-                        current_state_str = " ".join([x['piece'] if 'piece' in x else 'eps' for x in board_state])
-                        start_state_str = " ".join(
-                            [x['piece'] if 'piece' in x else 'eps' for x in start_state['board']])
-                        move_sequence = parse_move_string(moves)
-                        src_str = f"{current_state_str} <EOC> {start_state_str} <EOP> {' '.join(move_sequence)} <EOMH>"
-                        tgt_str = comment_words
-                        if len(move_sequence) == 1:
-                            single_che.append(src_str + '\n')
-                            single_en.append(tgt_str + '\n')
-
-                        multi_che.append(src_str + '\n')
-                        multi_en.append(tgt_str + '\n')
-
-                        start_state = elem
-
-            with open(out_file_multi_che, 'w') as mc, open(out_file_multi_en, 'w') as me, \
-                    open(out_file_single_che, 'w') as sc, open(out_file_single_en, 'w') as se:
-                mc.writelines(multi_che)
-                me.writelines(multi_en)
-                sc.writelines(single_che)
-                se.writelines(single_en)
-
-            logger.info(f"Processed {key}")
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.config,))
+        try:
+            for key, indices in self.split_data.items():
+                logger.info(f"Processing {key}")
+
+                out_file_multi_che = self.output_dir / f"{key}.che-eng.multi.che"
+                out_file_multi_en = self.output_dir / f"{key}.che-eng.multi.en"
+                out_file_single_che = self.output_dir / f"{key}.che-eng.single.che"
+                out_file_single_en = self.output_dir / f"{key}.che-eng.single.en"
+
+                # Lines are written as each game is formatted, so memory does not grow with the split
+                with open(out_file_multi_che, 'w') as mc, open(out_file_multi_en, 'w') as me, \
+                        open(out_file_single_che, 'w') as sc, open(out_file_single_en, 'w') as se:
+                    for lines in self._iter_formatted(key, indices, executor):
+                        with self.metrics.time('write'):
+                            for src_str, tgt_str, single in lines:
+                                if single:
+                                    sc.write(src_str + '\n')
+                                    se.write(tgt_str + '\n')
+                                mc.write(src_str + '\n')
+                                me.write(tgt_str + '\n')
+
+                logger.info(f"Processed {key}")
+        finally:
+            if executor:
+                executor.shutdown()
+
+        summary = self.metrics.write()
+        logger.info(f"Slowest stage: {summary['bottleneck_stage']}")
 
 
 def main():
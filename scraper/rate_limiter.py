@@ -0,0 +1,56 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class HostRateLimiter:
+    """Token buckets per host, plus one shared bucket enforcing the aggregate budget."""
+
+    def __init__(self, total_rate: float, host_rate: float = None, burst: float = None):
+        self._total = TokenBucket(total_rate, burst)
+        self._host_rate = host_rate or total_rate
+        self._burst = burst
+        self._hosts: dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HostRateLimiter":
+        """Build a limiter from `requests_per_second`, falling back to `request_delay`."""
+        total_rate = config.get('requests_per_second')
+        if not total_rate:
+            delay = config.get('request_delay') or 0
+            total_rate = 1 / delay if delay > 0 else 0
+        return cls(total_rate, config.get('per_host_requests_per_second'), config.get('request_burst'))
+
+    async def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = TokenBucket(self._host_rate, self._burst)
+        await bucket.acquire()
+        await self._total.acquire()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICIES = {
+    'timeout': {'max_attempts': 4, 'base_delay': 5, 'max_delay': 120},
+    'throttled': {'max_attempts': 6, 'base_delay': 30, 'max_delay': 600},
+    'server_error': {'max_attempts': 4, 'base_delay': 10, 'max_delay': 300},
+    'client_error': {'max_attempts': 1},
+    'other': {'max_attempts': 3, 'base_delay': 5, 'max_delay': 60},
+}
+
+
+class PageStatusError(Exception):
+    """Raised when a page is served with an HTTP error status."""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+def classify_error(error: Exception) -> str:
+    """Map a scrape failure to the name of the retry policy that handles it."""
+    if isinstance(error, PageStatusError):
+        if error.status in (429, 503):
+            return 'throttled'
+        return 'server_error' if error.status >= 500 else 'client_error'
+    if isinstance(error, asyncio.TimeoutError) or 'Timeout' in type(error).__name__:
+        return 'timeout'
+    return 'other'
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 1, base_delay: float = 1, max_delay: float = 60):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt: int) -> bool:
+        """`attempt` is the number of attempts made so far."""
+        return attempt < self.max_attempts
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def load_retry_policies(config: dict) -> dict[str, RetryPolicy]:
+    overrides = config.get('retry_policies') or {}
+    return {name: RetryPolicy(**{**defaults, **(overrides.get(name) or {})})
+            for name, defaults in DEFAULT_POLICIES.items()}
+
+
+class CircuitBreaker:
+    """
+    Pauses all requests for `cooldown` seconds when the error rate over the last `window`
+    outcomes exceeds `error_rate`, then resumes with a fresh window.
+    """
+
+    def __init__(self, window: int = 50, error_rate: float = 0.5, min_samples: int = 20, cooldown: float = 60):
+        self.error_rate = error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self.trips = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "CircuitBreaker":
+        return cls(**(config.get('circuit_breaker') or {}))
+
+    def record(self, success: bool):
+        self._outcomes.append(success)
+        if len(self._outcomes) < self.min_samples or self.is_open():
+            return
+        failures, total = self._outcomes.count(False), len(self._outcomes)
+        if failures / total > self.error_rate:
+            self.trips += 1
+            self._open_until = time.monotonic() + self.cooldown
+            self._outcomes.clear()
+            logger.warning(f"{failures} of the last {total} pages failed, pausing requests for {self.cooldown}s")
+
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    async def wait(self):
+        """Block while the breaker is open."""
+        while self.is_open():
+            await asyncio.sleep(self._open_until - time.monotonic())
@@ -2,14 +2,28 @@ import asyncio
 import json
 import logging
 import os
+import signal
+import time
 from datetime import datetime
 from pathlib import Path
 
 import yaml
+from aiohttp import ClientSession, ClientTimeout
+from bs4 import BeautifulSoup
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright
 
+from archive import HtmlArchive
+from catalog import GameCatalog
+from concurrency import AimdLimiter
+from journal import ScrapeJournal
+from metrics import Metrics
+from page_pool import PagePool
+from retry import CircuitBreaker, PageStatusError, classify_error, load_retry_policies
+from work_queue import LeaseQueue
+
 # Configure logging
-os.mkdir("./logs")
+os.makedirs("./logs", exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -20,22 +34,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Failure classes that indicate the site is overloaded, so concurrency should back off
+CONGESTION_ERRORS = ('timeout', 'throttled', 'server_error')
+
+# True once every board diagram matching the selector has its cells drawn and no new diagrams
+# appeared since the previous poll, evaluated inside the browser page
+BOARDS_READY_SCRIPT = """([selector, minCells]) => {
+    const frames = document.querySelectorAll(selector);
+    const drawn = frames.length > 0 && Array.from(frames).every(frame => {
+        const board = frame.querySelector('#board');
+        return board !== null && board.querySelectorAll(':scope > div').length >= minCells;
+    });
+    const settled = drawn && window.__readyFrameCount === frames.length;
+    window.__readyFrameCount = frames.length;
+    return settled;
+}"""
+
+# Returns the outerHTML of the commentary table, evaluated inside the browser page
+DIALOG_TABLE_SCRIPT = "() => { const table = document.querySelector('table.dialog'); return table ? table.outerHTML : null; }"
+
+
+def boards_drawn(soup: BeautifulSoup, frame_selector: str, min_cells: int) -> bool:
+    """Whether the page has board diagrams, each with at least `min_cells` cells in its #board."""
+    frames = soup.select(frame_selector)
+    return bool(frames) and all(
+        (board := frame.select_one('#board')) is not None and len(board.find_all('div', recursive=False)) >= min_cells
+        for frame in frames
+    )
+
+
+def wrap_fragment(fragment: str, url: str) -> str:
+    """Wrap an extracted commentary table in a minimal document with a metadata header."""
+    header = json.dumps({'url': url, 'scraped_at': datetime.utcnow().isoformat(), 'extract': 'dialog'})
+    return f"<!-- {header} -->\n<html><body>{fragment}</body></html>\n"
+
 
 class Scraper:
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, worker_name: str = 'main'):
         self.config = self.load_config(config_path)
+        self.worker_name = worker_name
         self.output_dir = Path(self.config['scrape_output_dir'])
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog = GameCatalog.from_config(self.config)
+        self.archive = None
+        if self.config.get('storage_format') == 'archive':
+            self.archive = HtmlArchive.from_config(self.config, writer=worker_name)
+        # Keep only the commentary table DataCollector parses, instead of the whole page
+        self.extract_dialog = self.config.get('scrape_extract') == 'dialog'
 
         # Status tracking
-        self.progress_file = self.output_dir / 'progress.json'
-        self.status = {
-            'successful_urls': set(),
-            'failed_urls': set(),
-            'last_index': self.config['start_index']
-        }
+        self.journal = ScrapeJournal(self.output_dir, worker=worker_name, fsync_every=self.config['save_frequency'])
+        self.completed_pages: set[tuple[int, int]] = set()
+        self.counts = {'successful': 0, 'failed': 0}
         self.load_progress()
 
+        # Pages still outstanding per game, so a game's catalog status is set once all are done
+        self._pending_pages: dict[int, int] = {}
+        self._failed_games: set[int] = set()
+        self.stop_event = asyncio.Event()
+
+        # Failed pages are re-queued with backoff; the breaker pauses everything when errors spike
+        self.retry_policies = load_retry_policies(self.config)
+        self.breaker = CircuitBreaker.from_config(self.config)
+        self._retry_tasks: set[asyncio.Task] = set()
+
+        # Number of pages in flight, adapted to observed latency and errors
+        self.limiter = AimdLimiter.from_config(self.config)
+        self.metrics = Metrics.from_config('scraper' if worker_name == 'main' else f"scraper-{worker_name}", self.config)
+
+        # Render readiness statistics
+        self.ready_stats = {'ready': 0, 'timed_out': 0, 'total_wait': 0.0}
+
+        # Pages served by the plain-HTTP fast path vs. rendered in the browser
+        self.session = None
+        self.path_counts = {'http': 0, 'browser': 0}
+
     @staticmethod
     def load_config(path: str) -> dict:
         """Load configuration from YAML file."""
@@ -43,120 +116,365 @@ class Scraper:
             return yaml.safe_load(f)
 
     def load_progress(self):
-        """Load progress from previous run if it exists."""
-        if self.progress_file.exists() and self.config['resume_enabled']:
-            try:
-                with open(self.progress_file, 'r') as f:
-                    saved_progress = json.load(f)
-                    self.status['successful_urls'] = set(saved_progress['successful_urls'])
-                    self.status['failed_urls'] = set(saved_progress['failed_urls'])
-                    self.status['last_index'] = saved_progress['last_index']
-                    logger.info(f"Resumed from index {self.status['last_index']}")
-            except Exception as e:
-                logger.error(f"Error loading progress: {e}")
+        """Load the pages already scraped by previous runs from the journal."""
+        if not self.config['resume_enabled']:
+            return
+        try:
+            outcomes = self.journal.replay()
+            if not outcomes:
+                outcomes = self._import_legacy_progress()
+            self.completed_pages = {page for page, ok in outcomes.items() if ok}
+            logger.info(f"Resuming with {len(self.completed_pages)} pages already scraped")
+        except Exception as e:
+            logger.error(f"Error loading progress: {e}")
+
+    def _import_legacy_progress(self) -> dict[tuple[int, int], bool]:
+        """Seed the journal from a progress.json written by older versions of the scraper."""
+        progress_file = self.output_dir / 'progress.json'
+        if not progress_file.exists():
+            return {}
+        with open(progress_file, 'r') as f:
+            saved_progress = json.load(f)
+
+        outcomes = {}
+        for url in saved_progress['successful_urls']:
+            link, _, page_num = url.split('/')[-1].partition('&pg=')
+            game_id = self.catalog.get_id(link)
+            if game_id is not None and page_num.isdigit():
+                outcomes[(game_id, int(page_num))] = True
+                self.journal.record(game_id, int(page_num), True)
+        self.journal.flush()
+        logger.info(f"Imported {len(outcomes)} scraped pages from {progress_file}")
+        return outcomes
 
     def save_progress(self):
-        """Save current progress."""
+        """Make recorded page outcomes durable."""
         try:
-            progress = {
-                'successful_urls': list(self.status['successful_urls']),
-                'failed_urls': list(self.status['failed_urls']),
-                'last_index': self.status['last_index'],
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            with open(self.progress_file, 'w') as f:
-                json.dump(progress, f)
+            self.journal.flush()
+            self.catalog.commit()
         except Exception as e:
             logger.error(f"Error saving progress: {e}")
 
-    async def scrape_page(self, browser, url: str, name: str) -> bool:
-        """Scrape and save the content of a single page."""
-        if url in self.status['successful_urls']:
-            return True
+    async def wait_until_ready(self, page) -> bool:
+        """
+        Wait until every board diagram the parser needs has its cells drawn, and the number
+        of diagrams has stopped growing.
 
-        page = None
-        try:
-            page = await browser.new_page()
-            await page.goto(url, timeout=self.config["page_timeout"] * 1000, wait_until='domcontentloaded')
+        Falls back to the fixed render_wait: if the diagrams are not ready by then,
+        the page is used as-is, exactly as with the plain sleep.
+        """
+        if not self.config.get('wait_for_ready'):
             await asyncio.sleep(self.config["render_wait"])
+            return False
+        try:
+            await page.wait_for_function(BOARDS_READY_SCRIPT,
+                                         arg=[self.config['ready_selector'], self.config.get('ready_board_cells', 64)],
+                                         polling=100, timeout=self.config["render_wait"] * 1000)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+
+    def _static_content(self, html: str) -> tuple[str, bool]:
+        soup = BeautifulSoup(html, 'html.parser')
+        if not boards_drawn(soup, self.config['ready_selector'], self.config.get('ready_board_cells', 64)):
+            return None, False
+        if self.extract_dialog:
+            table = soup.find('table', class_='dialog')
+            return str(table), True
+        return html, False
+
+    async def fetch_static(self, url: str) -> tuple[str, bool]:
+        """
+        Fetch a page over plain HTTP, returning its content and whether it is just the commentary table.
+
+        The content is None when the page has to be rendered in the browser instead: when the server
+        did not draw the board diagrams, or refused the request with a client error, which sites send
+        to clients that are not browsers. Throttling and server errors raise PageStatusError like
+        rendered pages do, so they are retried and slow the scraper down instead of being requested
+        again through the browser.
+        """
+        with self.metrics.time('fetch'):
+            async with self.session.get(url) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise PageStatusError(url, response.status)
+                if response.status >= 400:
+                    self.metrics.inc('http_refused')
+                    return None, False
+                html = await response.text()
+
+        # Parsing a whole page takes long enough to stall every other request on the event loop
+        with self.metrics.time('parse'):
+            return await asyncio.to_thread(self._static_content, html)
+
+    async def render_page(self, pages: PagePool, url: str) -> tuple[str, bool]:
+        """Render a page in the browser, returning its content and whether it is just the commentary table."""
+        async with pages.page() as page:
+            with self.metrics.time('fetch'):
+                response = await page.goto(url, timeout=self.config["page_timeout"] * 1000,
+                                           wait_until='domcontentloaded')
+            if response is not None and response.status >= 400:
+                raise PageStatusError(url, response.status)
+            with self.metrics.time('render'):
+                ready_start = time.monotonic()
+                ready = await self.wait_until_ready(page)
+                time_to_ready = time.monotonic() - ready_start
+
+                fragment = await page.evaluate(DIALOG_TABLE_SCRIPT) if self.extract_dialog else None
+                content = fragment if fragment is not None else await page.content()
 
-            content = await page.content()
+        self.ready_stats['ready' if ready else 'timed_out'] += 1
+        self.ready_stats['total_wait'] += time_to_ready
+        logger.info(f"Rendered {url} ({'ready' if ready else 'waited'} in {time_to_ready:.2f}s)")
+        return content, fragment is not None
 
-            filepath = self.output_dir / f"{name}.html"
-            with open(filepath, 'w', encoding='utf-8') as f:
+    def save_page(self, game_id: int, page_num: int, content: str):
+        name = f"saved{game_id}_{page_num}"
+        if self.archive:
+            self.archive.put(name, content, game_id, page_num)
+        else:
+            with open(self.output_dir / f"{name}.html", 'w', encoding='utf-8') as f:
                 f.write(content)
 
-            logger.info(f"Successfully scraped {url}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to scrape {url}: {e}")
-            return False
-        finally:
-            if page:
-                await page.close()
-                await asyncio.sleep(self.config['request_delay'])
+    async def scrape_page(self, pages: PagePool, url: str, game_id: int, page_num: int):
+        """Scrape and save the content of a single page, raising if it could not be fetched."""
+        content, is_fragment = await self.fetch_static(url) if self.session else (None, False)
+        path = 'http'
+        if content is None:
+            content, is_fragment = await self.render_page(pages, url)
+            path = 'browser'
+        if is_fragment:
+            content = wrap_fragment(content, url)
 
-    def load_urls(self) -> dict[str, int]:
-        """Load URLs from saved files."""
-        try:
-            with open(self.config['saved_links_path'], 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+        with self.metrics.time('write'):
+            self.save_page(game_id, page_num, content)
+        self.metrics.inc(f"pages_via_{path}")
+        self.metrics.inc('bytes_stored', len(content))
+        self.path_counts[path] += 1
+        logger.info(f"Successfully scraped {url} via {path}")
+
+    def log_ready_stats(self):
+        pages = self.ready_stats['ready'] + self.ready_stats['timed_out']
+        if not pages:
+            return
+        average = self.ready_stats['total_wait'] / pages
+        saved = pages * self.config["render_wait"] - self.ready_stats['total_wait']
+        logger.info(f"Render wait: {self.ready_stats['ready']} pages ready early, "
+                    f"{self.ready_stats['timed_out']} waited the full {self.config['render_wait']}s, "
+                    f"average {average:.2f}s per page ({saved:.0f}s saved overall)")
+
+    def iter_jobs(self, start_idx: int, end_idx: int):
+        """Lazily yield (game_id, page_num, url, attempts) for every page in the index range not yet scraped."""
+        game_url = self.config['game_url']
+        for game_id, link, page_count in self.catalog.iter_games(start_idx, end_idx):
+            remaining = [page_num for page_num in range(page_count) if (game_id, page_num) not in self.completed_pages]
+            if not remaining:
+                continue
+            self._pending_pages[game_id] = len(remaining)
+            for page_num in remaining:
+                yield game_id, page_num, f"{game_url}/{link}&pg={page_num}", 0
+
+    def record_result(self, game_id: int, page_num: int, success: bool, error: str = None):
+        self.journal.record(game_id, page_num, success, error)
+        if success:
+            self.counts['successful'] += 1
+            self.metrics.inc('pages_successful')
+        else:
+            self.counts['failed'] += 1
+            self.metrics.inc('pages_failed')
+            self._failed_games.add(game_id)
+
+        self._pending_pages[game_id] -= 1
+        if not self._pending_pages[game_id]:
+            del self._pending_pages[game_id]
+            status = GameCatalog.STATUS_SCRAPED
+            if game_id in self._failed_games:
+                self._failed_games.discard(game_id)
+                status = GameCatalog.STATUS_FAILED
+            self.catalog.set_status(game_id, status)
+            self.catalog.commit()
+
+    async def _produce(self, queue: asyncio.Queue, start_idx: int, end_idx: int):
+        for job in self.iter_jobs(start_idx, end_idx):
+            if self.stop_event.is_set():
+                logger.info("Stop requested, no longer queueing pages")
+                break
+            await queue.put(job)
+
+    async def _heartbeat(self, work_queue: LeaseQueue, range_id: int):
+        while True:
+            await asyncio.sleep(work_queue.lease_seconds / 3)
+            if not work_queue.renew(range_id, self.worker_name):
+                logger.warning(f"Lost the lease on range {range_id} to another worker")
+            work_queue.report(self.worker_name, self.counts['successful'], self.counts['failed'])
+
+    async def _produce_leased(self, queue: asyncio.Queue, work_queue: LeaseQueue):
+        """Lease game ranges from the shared work queue until none are left."""
+        work_queue.report(self.worker_name, self.counts['successful'], self.counts['failed'])
+        while not self.stop_event.is_set():
+            lease = work_queue.lease(self.worker_name)
+            if lease is None:
+                break
+            range_id, start_idx, end_idx = lease
+            logger.info(f"[{self.worker_name}] Leased games {start_idx} to {end_idx}")
+
+            heartbeat = asyncio.create_task(self._heartbeat(work_queue, range_id))
+            try:
+                await self._produce(queue, start_idx, end_idx)
+                await self._drain(queue)
+            finally:
+                heartbeat.cancel()
 
-    async def run(self):
+            self.save_progress()
+            if self.stop_event.is_set():
+                work_queue.release(range_id, self.worker_name)
+            else:
+                work_queue.complete(range_id, self.worker_name)
+            work_queue.report(self.worker_name, self.counts['successful'], self.counts['failed'])
+
+    async def _requeue(self, queue: asyncio.Queue, job: tuple, delay: float):
+        await asyncio.sleep(delay)
+        if not self.stop_event.is_set():
+            await queue.put(job)
+
+    def _handle_failure(self, queue: asyncio.Queue, job: tuple, error: Exception):
+        game_id, page_num, url, attempts = job
+        attempts += 1
+        error_class = classify_error(error)
+        policy = self.retry_policies[error_class]
+        if policy.should_retry(attempts) and not self.stop_event.is_set():
+            delay = policy.delay(attempts)
+            logger.warning(f"Failed to scrape {url} ({error_class}, attempt {attempts}): {error}; "
+                           f"retrying in {delay:.1f}s")
+            self.metrics.inc(f"retries_{error_class}")
+            task = asyncio.create_task(self._requeue(queue, (game_id, page_num, url, attempts), delay))
+            self._retry_tasks.add(task)
+            task.add_done_callback(self._retry_tasks.discard)
+        else:
+            logger.error(f"Failed to scrape {url} ({error_class}) after {attempts} attempts: {error}")
+            self.record_result(game_id, page_num, False, error_class)
+
+    async def _drain(self, queue: asyncio.Queue):
+        """Wait until every queued page and every scheduled retry has been processed."""
+        while True:
+            await queue.join()
+            if not self._retry_tasks:
+                return
+            await asyncio.wait(set(self._retry_tasks))
+
+    async def _worker(self, pages: PagePool, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            try:
+                if job is None:
+                    return
+                game_id, page_num, url, _ = job
+                await self.breaker.wait()
+                await self.limiter.acquire()
+                started = time.monotonic()
+                congested = False
+                try:
+                    await self.scrape_page(pages, url, game_id, page_num)
+                except Exception as e:
+                    self.breaker.record(False)
+                    congested = classify_error(e) in CONGESTION_ERRORS
+                    self._handle_failure(queue, job, e)
+                else:
+                    self.breaker.record(True)
+                    self.record_result(game_id, page_num, True)
+                finally:
+                    latency = time.monotonic() - started
+                    await asyncio.sleep(self.config['request_delay'])
+                    await self.limiter.release(latency, congested)
+            finally:
+                queue.task_done()
+
+    def _handle_sigint(self):
+        if self.stop_event.is_set():
+            return
+        logger.info("Interrupted, draining in-flight pages (interrupt again to abort)")
+        self.stop_event.set()
+        for task in self._retry_tasks:
+            task.cancel()
+        # A second interrupt falls back to the default KeyboardInterrupt
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+
+    async def run(self, work_queue: LeaseQueue = None):
+        """Scrape the configured index range, or ranges leased from `work_queue` in sharded mode."""
         try:
             logger.info("Starting scraper...")
 
-            # Load URLs
-            links = list(self.load_urls().items())
-            logger.info(f"Loaded {len(links)} URLs")
+            game_count = len(self.catalog)
+            logger.info(f"Loaded {game_count} URLs")
 
-            # Get URL slice based on index range
-            start_idx = max(self.status['last_index'], self.config['start_index'])
-            end_idx = min(self.config['end_index'], len(links)) if self.config['end_index'] else len(links)
+            # Get game ID slice based on index range
+            start_idx = self.config['start_index'] or 0
+            end_idx = min(self.config['end_index'], game_count) if self.config['end_index'] else game_count
             logger.info(f"Processing URLs from index {start_idx} to {end_idx}")
-            game_url = self.config['game_url']
+
+            loop = asyncio.get_running_loop()
+            try:
+                loop.add_signal_handler(signal.SIGINT, self._handle_sigint)
+            except NotImplementedError:
+                pass  # Not supported on Windows event loops
+
+            if self.config.get('http_fast_path'):
+                self.session = ClientSession(
+                    timeout=ClientTimeout(total=self.config['page_timeout']),
+                    headers={'User-Agent': self.config.get('user_agent') or 'Mozilla/5.0'}
+                )
 
             async with async_playwright() as p:
                 browser = await p.chromium.launch(
                     args=['--no-sandbox', '--disable-dev-shm-usage']
                 )
 
-                semaphore = asyncio.Semaphore(self.config['max_concurrent'])
-
-                async def bounded_scrape(url, index, name):
-                    async with semaphore:
-                        success = await self.scrape_page(browser, url, name)
-                        if success:
-                            self.status['successful_urls'].add(url)
-                        else:
-                            self.status['failed_urls'].add(url)
-                        self.status['last_index'] = index
-                        if index % self.config['save_frequency'] == 0:
-                            self.save_progress()
-
-                tasks = []
-                for i in range(start_idx, end_idx):
-                    url, page_count = links[i]
-                    for page_num in range(page_count):
-                        page_url = f"{game_url}/{url}&pg={page_num}"
-                        saved_name = f"saved{i}_{page_num}"
-                        tasks.append(bounded_scrape(page_url, i, saved_name))
-
-                await asyncio.gather(*tasks)
+                # One worker per slot the limiter may ever allow; idle ones wait in acquire()
+                max_workers = self.limiter.ceiling
+                pages = PagePool.from_config(browser, self.config, size=max_workers)
+                queue = asyncio.Queue(maxsize=self.config.get('queue_size') or 2 * max_workers)
+                workers = [asyncio.create_task(self._worker(pages, queue)) for _ in range(max_workers)]
+
+                if work_queue:
+                    await self._produce_leased(queue, work_queue)
+                else:
+                    await self._produce(queue, start_idx, end_idx)
+                await self._drain(queue)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+                await pages.close()
                 await browser.close()
+                if pages.block_resources:
+                    logger.info(f"Blocked {pages.blocked_requests} resource requests")
+                self.log_ready_stats()
+                limits = [limit for _, limit in self.limiter.history]
+                logger.info(f"Concurrency changed {len(limits) - 1} times "
+                            f"(min {min(limits)}, max {max(limits)}, final {self.limiter.limit})")
 
+            logger.info(f"Fetched {self.path_counts['http']} pages over plain HTTP, "
+                        f"rendered {self.path_counts['browser']} in the browser")
             self.save_progress()
 
-            logger.info(f"Scraping completed. "
-                        f"Successful: {len(self.status['successful_urls'])}, "
-                        f"Failed: {len(self.status['failed_urls'])}")
+            logger.info(f"Scraping {'stopped' if self.stop_event.is_set() else 'completed'}. "
+                        f"Successful: {self.counts['successful']}, "
+                        f"Failed: {self.counts['failed']}, "
+                        f"circuit breaker trips: {self.breaker.trips}")
+            self.metrics.inc('circuit_breaker_trips', self.breaker.trips)
+            summary = self.metrics.write()
+            logger.info(f"Slowest stage: {summary['bottleneck_stage']}")
 
         except Exception as e:
             logger.error(f"Scraping process failed: {e}")
             self.save_progress()
             raise
+        finally:
+            if self.session:
+                await self.session.close()
+                self.session = None
+            try:
+                asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+            except NotImplementedError:
+                pass
 
 
 async def main():
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import socket
+from pathlib import Path
+
+import yaml
+
+from catalog import GameCatalog
+from work_queue import LeaseQueue
+
+
+def run_worker(config_path: str, worker_name: str):
+    from scraper import Scraper
+
+    scraper = Scraper(config_path, worker_name=worker_name)
+    work_queue = LeaseQueue.from_config(scraper.config)
+    try:
+        asyncio.run(scraper.run(work_queue=work_queue))
+    finally:
+        work_queue.close()
+
+
+def print_summary(work_queue: LeaseQueue):
+    summary = work_queue.summary()
+    ranges = summary['ranges']
+    print(f"{summary['workers']} workers, ranges done {ranges.get('done', 0)}/{sum(ranges.values())}, "
+          f"{summary['successful']} pages scraped, {summary['failed']} failed, "
+          f"{summary['pages_per_minute']:.1f} pages/min aggregate")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape with several worker processes sharing a lease queue")
+    parser.add_argument('--config', default='./config.yaml')
+    parser.add_argument('--workers', type=int, help="Worker processes on this host (default: shard_workers)")
+    parser.add_argument('--name', default=socket.gethostname(), help="Worker name prefix, unique per host")
+    parser.add_argument('--reset', action='store_true', help="Discard existing ranges and start a new run")
+    args = parser.parse_args()
+
+    config = yaml.safe_load(Path(args.config).read_text())
+    work_queue = LeaseQueue.from_config(config)
+    if args.reset:
+        work_queue.reset()
+
+    catalog = GameCatalog.from_config(config)
+    start_idx = config['start_index'] or 0
+    end_idx = config['end_index']
+    game_ids = [game_id for game_id in catalog.game_ids()
+                if game_id >= start_idx and (end_idx is None or game_id < end_idx)]
+    catalog.close()
+    range_count = work_queue.populate(game_ids, config.get('shard_range_size') or 50)
+    print(f"Work queue has {range_count} ranges over {len(game_ids)} games")
+
+    # Spawned workers get their own interpreter, event loop and browser
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_worker, args=(args.config, f"{args.name}-{n}"))
+               for n in range(args.workers or config.get('shard_workers') or 1)]
+    for worker in workers:
+        worker.start()
+
+    # Ctrl-C reaches the workers directly, which drain and release their leases
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    report_interval = config.get('shard_report_interval') or 30
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(timeout=report_interval / len(workers))
+        print_summary(work_queue)
+
+    print_summary(work_queue)
+    work_queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from pathlib import Path
 
 import yaml
 
+from catalog import GameCatalog
+
 
 class LinkSplitter:
     def __init__(self, config_path):
@@ -14,13 +16,12 @@ class LinkSplitter:
         self.random_seed = self.config['random_seed']
 
     def _load_link_indices(self) -> list[int]:
-        """Load URLs from saved files."""
+        """Load game IDs from the catalog."""
+        catalog = GameCatalog.from_config(self.config)
         try:
-            with open(self.config['saved_links_path'], 'r') as f:
-                link_size = len(json.load(f))
-                return list(range(link_size))
-        except FileNotFoundError:
-            return []
+            return catalog.game_ids()
+        finally:
+            catalog.close()
 
     def split_and_save_links(self) -> None:
         train_links, valid_links, test_links = self.split_links()
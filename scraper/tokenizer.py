@@ -0,0 +1,161 @@
+import logging
+import re
+import string
+from functools import lru_cache
+
+from nltk.tokenize import word_tokenize
+from nltk.tokenize.destructive import NLTKWordTokenizer
+from nltk.tokenize.punkt import PunktTokenizer
+
+logger = logging.getLogger(__name__)
+
+# Every quote rule of the word tokenizer needs one of these, and only quote rules add ' or `
+QUOTE_CHARS = frozenset("\"'`«»“”‘’„")
+
+# Characters a punctuation rule needs before it can match, keyed by its pattern.
+# Rules missing here (e.g. from a newer NLTK) always run.
+PUNCTUATION_NEEDS = {
+    r'([^\.])(\.)([\]\)}>"\'' "»”’ " r"]*)\s*$": ".",
+    r"([:,])([^\d])": ":,",
+    r"([:,])$": ":,",
+    r"\.{2,}": ".",
+    r"[;@#$%&]": ";@#$%&",
+    r"[\u2012-\u2015]": "\u2012\u2013\u2014\u2015",
+    r'([^\.])(\.)([\]\)}>"\']*)\s*$': ".",
+    r"[?!]": "?!",
+    r"([^'])' ": "'",
+    r"[*]": "*",
+}
+PARENS_CHARS = frozenset("[](){}<>")
+CONTRACTION_WORDS = re.compile(r"(?i)cannot|d'ye|gimme|gonna|gotta|lemme|more'n|wanna")
+
+# Comments exercising each shortcut, checked against word_tokenize before the fast tokenizer is used
+SELF_CHECK_COMMENTS = (
+    "White castles. Black replies with Nf6 , a solid move.",
+    "A blunder!! Why not Qxd5? Mr. Smith missed it... again",
+    "He said \"take it\" -- but 'Bb5' wasn't played (see move 12).",
+    "I cannot see why he'd gonna trade; e.g. 14.Rxe1 wins $5 & more: 3:0.",
+    "Black is lost.  White mates in 2.White resigns?",
+    "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6",
+    "Nxe5* [a novelty] {or not} <sic> @home #1 -- wanna bet?",
+    "The bishops' diagonal\u2013and the threat,",
+    "",
+)
+
+
+def normalize_comment(comment: str) -> str:
+    """A scraped comment as it is tokenized: ASCII only, without surrounding whitespace."""
+    return comment.encode('ascii', 'replace').strip().decode('ascii')
+
+
+class CommentTokenizer:
+    """
+    Gives the same tokens as NLTK's word_tokenize, faster.
+
+    Sentences are split with the same Punkt model, but the word before each candidate
+    break is found with str.rfind instead of a character loop, and break decisions are
+    memoised, since comments repeat the same few contexts ("move. White"). Words are split
+    with NLTKWordTokenizer's own compiled rules, skipping each rule whose characters are
+    not in the sentence; most comments have no quotes, brackets or contractions.
+
+    This leans on Punkt internals, so create_tokenizer checks it against word_tokenize
+    before use.
+    """
+
+    def __init__(self, language: str = 'english', sentence_tokenizer=None):
+        self.punkt = sentence_tokenizer or PunktTokenizer(language)
+        self._period_context = self.punkt._lang_vars.period_context_re()
+        self._sent_end_chars = frozenset(self.punkt._lang_vars.sent_end_chars)
+        self._contains_sentbreak = lru_cache(maxsize=65536)(self.punkt.text_contains_sentbreak)
+        self._punctuation = [(regexp, substitution, frozenset(PUNCTUATION_NEEDS.get(regexp.pattern, '')))
+                             for regexp, substitution in NLTKWordTokenizer.PUNCTUATION]
+
+    def _end_contexts(self, text: str):
+        """PunktSentenceTokenizer._match_potential_end_contexts, finding the previous word with rfind."""
+        previous_start, previous_stop = 0, 0
+        previous_match = None
+        for match in self._period_context.finditer(text):
+            last_space = max(text.rfind(char, previous_stop, match.start()) for char in string.whitespace)
+            # Punkt treats whitespace right at the previous stop like no whitespace at all
+            word_start = last_space + 1 if last_space > previous_stop else previous_start
+            if previous_match and previous_stop <= word_start:
+                yield previous_match, (text[previous_start:previous_stop] + previous_match.group()
+                                       + previous_match.group('after_tok'))
+            previous_match = match
+            previous_start, previous_stop = word_start, match.start()
+        if previous_match:
+            yield previous_match, (text[previous_start:previous_stop] + previous_match.group()
+                                   + previous_match.group('after_tok'))
+
+    def _slices(self, text: str):
+        last_break = 0
+        for match, context in self._end_contexts(text):
+            if self._contains_sentbreak(context):
+                yield slice(last_break, match.end())
+                last_break = match.start('next_tok') if match.group('next_tok') else match.end()
+        yield slice(last_break, len(text.rstrip()))
+
+    def sentences(self, text: str) -> list[str]:
+        if self._sent_end_chars.isdisjoint(text):
+            text = text.rstrip()
+            return [text] if text else []
+        return [text[s] for s in self.punkt._realign_boundaries(text, self._slices(text))]
+
+    def words(self, text: str) -> list[str]:
+        """NLTKWordTokenizer.tokenize, running only the rules that can match."""
+        chars = set(text)
+        quoted = not chars.isdisjoint(QUOTE_CHARS)
+        words = NLTKWordTokenizer
+
+        if quoted:
+            for regexp, substitution in words.STARTING_QUOTES:
+                text = regexp.sub(substitution, text)
+        for regexp, substitution, needs in self._punctuation:
+            if not needs or not chars.isdisjoint(needs):
+                text = regexp.sub(substitution, text)
+        if not chars.isdisjoint(PARENS_CHARS):
+            regexp, substitution = words.PARENS_BRACKETS
+            text = regexp.sub(substitution, text)
+        if '-' in chars:
+            regexp, substitution = words.DOUBLE_DASHES
+            text = regexp.sub(substitution, text)
+
+        text = " " + text + " "
+        if quoted:
+            # Besides quotes these only squeeze whitespace, which split() ignores anyway
+            for regexp, substitution in words.ENDING_QUOTES:
+                text = regexp.sub(substitution, text)
+        if CONTRACTION_WORDS.search(text):
+            for regexp in words.CONTRACTIONS2:
+                text = regexp.sub(r" \1 \2 ", text)
+        if quoted:
+            for regexp in words.CONTRACTIONS3:
+                text = regexp.sub(r" \1 \2 ", text)
+        return text.split()
+
+    def tokenize(self, text: str) -> list[str]:
+        return [token for sentence in self.sentences(text) for token in self.words(sentence)]
+
+
+def create_tokenizer(name: str):
+    """
+    A function from a comment to its tokens: 'nltk' (word_tokenize) or 'fast' (CommentTokenizer).
+
+    'fast' falls back to word_tokenize if it fails to load or disagrees with it on
+    SELF_CHECK_COMMENTS, e.g. after an NLTK upgrade changed the internals it relies on.
+    """
+    if name == 'nltk':
+        return word_tokenize
+    if name != 'fast':
+        raise ValueError(f"Unknown comment tokenizer: {name}")
+    try:
+        tokenize = CommentTokenizer().tokenize
+        mismatches = [comment for comment in SELF_CHECK_COMMENTS if tokenize(comment) != word_tokenize(comment)]
+    except (AttributeError, TypeError, IndexError) as e:
+        logger.warning(f"Fast comment tokenizer is incompatible with this NLTK ({e}); using word_tokenize")
+        return word_tokenize
+    if mismatches:
+        logger.warning(f"Fast comment tokenizer disagrees with word_tokenize on {mismatches[0]!r}; "
+                       f"using word_tokenize")
+        return word_tokenize
+    return tokenize
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+import chess
+import yaml
+
+from board_codec import board_fen
+from catalog import GameCatalog
+from corpus import COLUMNS, CorpusWriter, compact_corpus
+from game_reader import GameReader, validated_format
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+VALIDATED_COLUMNS = COLUMNS + ('fen', 'uci', 'san')
+
+MOVE_NUMBER = re.compile(r'^(\d+)(\.+)')
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+
+
+def parse_move_text(moves: str) -> list[tuple[Optional[bool], str]]:
+    """
+    (side to move, SAN) for each move in a step's move text, e.g. "12. Nf3 Nc6" or "12... Nc6".
+
+    The side is chess.WHITE or chess.BLACK when a move number gives it, otherwise None.
+    """
+    side = None
+    parsed = []
+    for token in moves.split("\n")[0].split():  # Later lines are layout
+        match = MOVE_NUMBER.match(token)
+        if match:
+            side = chess.BLACK if len(match.group(2)) >= 3 else chess.WHITE
+            token = token[match.end():]
+        token = token.rstrip("!?")
+        if not token or token in RESULTS:
+            continue
+        parsed.append((side, token))
+        if side is not None:
+            side = not side
+    return parsed
+
+
+def _resync(board: chess.Board, diagram: str, to_move: bool):
+    """Continue from the scraped diagram after a step that could not be replayed."""
+    board.set_board_fen(diagram)
+    board.turn = to_move
+    board.ep_square = None
+    board.clean_castling_rights()
+
+
+def validate_game(game: tuple[int, list]) -> tuple[int, list, list]:
+    """
+    Replay a game's moves from the initial position, checking each step's diagram.
+
+    Returns the game ID, the (page, steps) of every page whose steps all replayed and
+    matched their diagrams, with each step's FEN, UCI and SAN added, and one issue per
+    failing step. After a failing step the replay resumes from that step's diagram.
+    """
+    game_id, pages = game
+    board = chess.Board()
+    valid_pages, issues = [], []
+    for page, steps in pages:
+        annotated = []
+        for step, step_info in enumerate(steps):
+            diagram = board_fen(step_info['board'])
+            issue = None
+            mover = board.turn
+            sans, ucis = [], []
+            for side, san in parse_move_text(step_info['moves']):
+                if side is not None:
+                    board.turn = side  # The move number is authoritative after a resync
+                mover = board.turn
+                try:
+                    move = board.parse_san(san)
+                except ValueError:
+                    issue = f"illegal move {san}"
+                    break
+                sans.append(board.san(move))
+                ucis.append(move.uci())
+                board.push(move)
+
+            if diagram is None:
+                issue = issue or "unreadable board"
+            elif issue is None and board.board_fen() != diagram:
+                issue = "board does not match moves"
+            if issue:
+                issues.append({'game_id': game_id, 'page': page, 'step': step, 'moves': step_info['moves'],
+                               'issue': issue, 'replayed': board.board_fen(), 'diagram': diagram})
+                if diagram is not None:
+                    _resync(board, diagram, not mover)
+
+            annotated.append({
+                'moves': step_info['moves'],
+                'board': step_info['board'],
+                'comment': step_info['comment'],
+                'fen': board.fen(),
+                'uci': " ".join(ucis),
+                'san': " ".join(sans),
+            })
+        if not any(issue['page'] == page for issue in issues):
+            valid_pages.append((page, annotated))
+    return game_id, valid_pages, issues
+
+
+def validate_corpus(config: dict, game_ids: Optional[set[int]] = None):
+    """
+    Validate parsed games on all cores, writing their clean pages to validated_corpus_dir.
+
+    With `game_ids`, only those games (e.g. the ones whose pages were just parsed again) are
+    validated and their rows appended to the existing validated corpus, superseding the old ones.
+    Otherwise, or if there is no validated corpus yet, every game is validated and the corpus rebuilt.
+    A dropped page is stored without steps, so it also supersedes a previously clean version.
+    """
+    catalog = GameCatalog.from_config(config)
+    metrics = Metrics.from_config('validator', config)
+    output_dir = Path(config['validated_corpus_dir'])
+    fmt = validated_format(config)
+    shard_rows = config.get('corpus_shard_rows') or 100000
+    incremental = game_ids is not None and output_dir.exists()
+    if incremental:
+        if not game_ids:
+            catalog.close()
+            logger.info("No games changed since they were validated")
+            return
+        game_ids = sorted(game_ids)
+        writer_dir = output_dir
+    else:
+        game_ids = catalog.game_ids()
+        # Build the new corpus beside the old one, so readers never see a partial run
+        writer_dir = output_dir.with_name(output_dir.name + ".tmp")
+        shutil.rmtree(writer_dir, ignore_errors=True)
+    reader = GameReader(config, catalog, metrics)
+    writer = CorpusWriter(writer_dir, fmt, shard_rows, VALIDATED_COLUMNS)
+    workers = config.get('parse_workers') or os.cpu_count()
+
+    games = reader.iter_games(game_ids)
+    with ProcessPoolExecutor(workers) as executor, open(config['validation_report_path'], 'w') as report:
+        # Submit a bounded batch at a time, since map would queue every game at once
+        while batch := list(islice(games, workers * 64)):
+            for game_id, valid_pages, issues in executor.map(validate_game, batch, chunksize=16):
+                dropped_pages = sorted({issue['page'] for issue in issues})
+                for page, steps in valid_pages:
+                    writer.add_page(game_id, page, steps)
+                for page in dropped_pages:
+                    writer.add_page(game_id, page, [])
+                report.writelines(json.dumps(issue) + "\n" for issue in issues)
+                metrics.inc('games')
+                metrics.inc('pages_kept', len(valid_pages))
+                metrics.inc('pages_dropped', len(dropped_pages))
+                metrics.inc('steps_flagged', len(issues))
+    writer.close()
+    catalog.close()
+
+    if incremental:
+        compact_corpus(output_dir, fmt, shard_rows, VALIDATED_COLUMNS, config.get('corpus_compact_threshold') or 0.25)
+    else:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        writer_dir.rename(output_dir)
+    summary = metrics.write()
+    logger.info(f"Validated {summary['counters'].get('games', 0)} games: "
+                f"{summary['counters'].get('pages_kept', 0)} pages kept, "
+                f"{summary['counters'].get('pages_dropped', 0)} dropped")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = yaml.safe_load(Path("./config.yaml").read_text())
+    validate_corpus(config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ranges (
+    id INTEGER PRIMARY KEY,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS ranges_status ON ranges (status);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+class LeaseQueue:
+    """
+    Shared queue of game ID ranges that scraper workers lease, scrape and mark done.
+
+    The database uses SQLite's rollback journal with `BEGIN IMMEDIATE` transactions, which rely
+    only on file locks, so workers on several hosts can share it over a filesystem with working
+    POSIX locking. A lease that is not renewed before it expires is handed to another worker.
+    """
+
+    def __init__(self, path, lease_seconds: float = 600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "LeaseQueue":
+        return cls(config['work_queue_path'], config.get('shard_lease_seconds') or 600)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self, statements):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements()
+            self.conn.execute("COMMIT")
+            return result
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def populate(self, game_ids: list[int], range_size: int) -> int:
+        """Split the game IDs into ranges, unless another worker already did. Returns the range count."""
+
+        def statements():
+            existing = self.conn.execute("SELECT COUNT(*) FROM ranges").fetchone()[0]
+            if existing:
+                return existing
+            ranges = [(game_ids[i], game_ids[min(i + range_size, len(game_ids)) - 1] + 1)
+                      for i in range(0, len(game_ids), range_size)]
+            self.conn.executemany("INSERT INTO ranges (start, end) VALUES (?, ?)", ranges)
+            return len(ranges)
+
+        return self._transaction(statements)
+
+    def reset(self):
+        """Forget all ranges and worker totals, so the next populate() starts a fresh run."""
+
+        def statements():
+            self.conn.execute("DELETE FROM ranges")
+            self.conn.execute("DELETE FROM workers")
+
+        self._transaction(statements)
+
+    def lease(self, owner: str) -> Optional[tuple[int, int, int]]:
+        """Lease the next pending (or abandoned) range, returning (range_id, start, end)."""
+
+        def statements():
+            now = time.time()
+            row = self.conn.execute(
+                "SELECT id, start, end FROM ranges "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE ranges SET status = 'leased', owner = ?, lease_expires = ? WHERE id = ?",
+                    (owner, now + self.lease_seconds, row[0])
+                )
+            return row
+
+        return self._transaction(statements)
+
+    def renew(self, range_id: int, owner: str) -> bool:
+        """Extend a lease; returns False if it was lost to another worker."""
+        cursor = self.conn.execute(
+            "UPDATE ranges SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+            (time.time() + self.lease_seconds, range_id, owner)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, range_id: int, owner: str):
+        self.conn.execute(
+            "UPDATE ranges SET status = 'done', lease_expires = NULL WHERE id = ? AND owner = ?",
+            (range_id, owner)
+        )
+
+    def release(self, range_id: int, owner: str):
+        """Give an unfinished range back so another worker can lease it straight away."""
+        self.conn.execute(
+            "UPDATE ranges SET status = 'pending', owner = NULL, lease_expires = NULL "
+            "WHERE id = ? AND owner = ? AND status = 'leased'",
+            (range_id, owner)
+        )
+
+    def report(self, owner: str, successful: int, failed: int):
+        """Record a worker's running totals, used for the aggregate throughput summary."""
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO workers (name, successful, failed, started_at, last_seen) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET successful = excluded.successful, failed = excluded.failed, "
+            "last_seen = excluded.last_seen",
+            (owner, successful, failed, now, now)
+        )
+
+    def summary(self) -> dict:
+        ranges = dict(self.conn.execute("SELECT status, COUNT(*) FROM ranges GROUP BY status").fetchall())
+        workers, successful, failed, started, last_seen = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(successful), 0), COALESCE(SUM(failed), 0), MIN(started_at), MAX(last_seen) "
+            "FROM workers"
+        ).fetchone()
+        elapsed = (last_seen - started) if workers else 0
+        pages = successful + failed
+        return {
+            'ranges': ranges,
+            'workers': workers,
+            'successful': successful,
+            'failed': failed,
+            'elapsed': elapsed,
+            'pages_per_minute': pages / elapsed * 60 if elapsed else 0.0,
+        }